@@ -0,0 +1,82 @@
+"""Throughput of the keyword extraction stage of generate_account_rules.
+
+Builds (or reuses) a synthetic book with benchmarks/synth.py, reads its
+splits once with iter_splits_sql and then times, on the same records:
+
+  per-split    clean_and_extract_keywords on every split description
+  batched/N    extract_keywords_many (distinct descriptions) with N workers
+  fold/N       update_rules_state with N workers, extraction included
+
+    python benchmarks/keywords.py --splits 500k --workers 1,4 --data-dir /tmp/bench
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from synth import make_book, parse_count  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark keyword extraction for rule generation.")
+    parser.add_argument('--splits', default='500k', help="splits in the synthetic book (default: %(default)s)")
+    parser.add_argument('--workers', default='1,%d' % (os.cpu_count() or 1),
+                        help="worker counts to try, comma separated (default: %(default)s)")
+    parser.add_argument('--data-dir', default=None,
+                        help="where the generated book is kept and reused (default: a temporary directory)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='gnusplitcash-bench-')
+    os.makedirs(data_dir, exist_ok=True)
+    # Every synthetic transaction has two splits
+    transactions = parse_count(args.splits) // 2
+    book_file = os.path.join(data_dir, f'book_{transactions}.gnucash')
+    try:
+        if not os.path.exists(book_file):
+            print(f"generating {os.path.basename(book_file)} ...", flush=True)
+            make_book(book_file + '.tmp', transactions)
+            os.replace(book_file + '.tmp', book_file)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            import piecash
+            import generate_account_rules as rules
+            book = piecash.open_book(book_file, open_if_lock=True)
+            start = time.perf_counter()
+            records = list(rules.iter_splits_sql(book))
+            read_seconds = time.perf_counter() - start
+            book.close()
+        descriptions = [record[4] for record in records]
+        print(f"{len(records)} splits, {len(set(descriptions))} distinct descriptions, "
+              f"read in {read_seconds:.2f}s")
+        print(f"{'stage':<16} {'seconds':>9} {'splits/s':>11}")
+
+        def report(name, seconds):
+            print(f"{name:<16} {seconds:>9.2f} {len(records) / seconds:>11.0f}", flush=True)
+
+        start = time.perf_counter()
+        for description in descriptions:
+            rules.clean_and_extract_keywords(description)
+        report('per-split', time.perf_counter() - start)
+        for workers in [int(n) for n in args.workers.split(',') if n]:
+            start = time.perf_counter()
+            rules.extract_keywords_many(descriptions, workers)
+            report(f'batched/{workers}', time.perf_counter() - start)
+            start = time.perf_counter()
+            rules.update_rules_state(rules.new_rules_state(), records, workers)
+            report(f'fold/{workers}', time.perf_counter() - start)
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Local stand-in for the AMFI NAV history endpoint.
+
+Answers `?mf=N&tp=1&frmdt=dd-Mon-yyyy&todt=dd-Mon-yyyy` with a NAV history
+in AMFI's semicolon format: one NAV per weekday for scheme codes N*1000+1
+and N*1000+2. Every response is delayed by `latency` seconds. Point the
+converters at it with AMFI_NAV_HISTORY_URL=<server.url>.
+
+    python benchmarks/mock_amfi.py --port 8765 --latency 0.2
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HEADER = ('Scheme Code;Scheme Name;ISIN Div Payout/ISIN Growth;ISIN Div Reinvestment;'
+          'Net Asset Value;Repurchase Price;Sale Price;Date')
+
+
+def nav_history(mf_number, from_date, to_date):
+    """Returns the response body for one NAV history request."""
+    lines = [HEADER, '', 'Open Ended Schemes ( Equity )', '', f'Mock Fund House {mf_number}', '']
+    day = from_date
+    while day <= to_date:
+        if day.weekday() < 5:
+            for scheme_code in (mf_number * 1000 + 1, mf_number * 1000 + 2):
+                nav = 10 + scheme_code % 100 + day.toordinal() % 1000 / 100
+                lines.append(f'{scheme_code};Mock Scheme {scheme_code};INF000000000;;{nav:.4f};;;{day:%d-%b-%Y}')
+        day += timedelta(days=1)
+    return '\r\n'.join(lines).encode()
+
+
+class MockAmfiServer:
+    """Threaded mock NAV server; counts the requests it answers."""
+
+    def __init__(self, latency=0.0, port=0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                query = parse_qs(urlparse(self.path).query)
+                try:
+                    body = nav_history(
+                        int(query['mf'][0]),
+                        datetime.strptime(query['frmdt'][0], '%d-%b-%Y').date(),
+                        datetime.strptime(query['todt'][0], '%d-%b-%Y').date(),
+                    )
+                except (KeyError, ValueError):
+                    self.send_error(400)
+                    return
+                time.sleep(server.latency)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/DownloadNAVHistoryReport_Po.aspx'
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock AMFI NAV history.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds to delay every response")
+    args = parser.parse_args()
+    server = MockAmfiServer(args.latency, args.port)
+    print(f"Serving mock NAV history at {server.url} (latency {args.latency}s)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Benchmark harness for the converters and the rule generator.
+
+Generates synthetic statements, rule files and books (benchmarks/synth.py),
+starts a mock AMFI NAV server (benchmarks/mock_amfi.py) and runs
+convert_v2.py, convert.py --compat v1 and generate_account_rules.py against them as
+separate processes. Reports wall time, rows/s, peak RSS and NAV requests
+per run. Inputs are cached in --data-dir, so repeated runs only pay for
+generation once.
+
+    python benchmarks/run.py --sizes 1k,100k --rules 50x25,1500x100 --books 5k
+    python benchmarks/run.py --sizes 1m --skip-legacy --json results.json
+    python benchmarks/run.py --sizes '' --books '' --nav-fetch 8 --latency 0.2
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_amfi import MockAmfiServer  # noqa: E402
+from synth import make_book, make_rules, make_statement, parse_count  # noqa: E402
+
+
+def run_process(args, cwd, env):
+    """Runs a command; returns (seconds, peak RSS in MB, exit status, output tail)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    # Read output before waiting so a chatty process can't block on a full pipe
+    output = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    tail = output.decode(errors='replace').strip().splitlines()[-1:] or ['']
+    return elapsed, peak_mb, proc.returncode, tail[0]
+
+
+def cached_input(data_dir, name, generate):
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        print(f"generating {name} ...", flush=True)
+        generate(path + '.tmp')
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def parse_peak_memory(body):
+    """Returns [(parser, rows, peak bytes)] of parsing a NAV history `body` (bytes)
+    as one decoded string and as a stream of lines, measured with tracemalloc."""
+    import io
+    import tracemalloc
+    import mf_nav_util
+
+    def decoded():
+        return mf_nav_util.parse_amfi_nav_data(body.decode())
+
+    def streamed():
+        # Lines arrive one at a time, as from response.iter_lines()
+        return mf_nav_util.parse_amfi_nav_lines(iter(io.BytesIO(body)))
+
+    results = []
+    for name, parse in (('parse_amfi_nav_data', decoded), ('parse_amfi_nav_lines', streamed)):
+        tracemalloc.start()
+        try:
+            nav_df = parse()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results.append((name, len(nav_df), peak))
+        del nav_df
+    return results
+
+
+def micro_benchmarks(server, statement_path, rules_path):
+    """Times rule matching, NAV parsing and NAV lookup in-process.
+
+    Returns (timings, get_nav_for_date NAV requests, parse_peak_memory results).
+    """
+    sys.path.insert(0, REPO_DIR)
+    import csv
+    from datetime import date, timedelta
+    import mf_nav_util
+    from mock_amfi import nav_history
+    from rules_cache import load_rule_matcher
+
+    results = []
+    matcher, _ = load_rule_matcher(rules_path, use_cache=False)
+    with open(statement_path, newline='') as f:
+        rows = [(row['Transaction Remarks'], float(row['Withdrawal Amount (INR )']) or float(row['Deposit Amount (INR )']))
+                for row in csv.DictReader(f)]
+    start = time.perf_counter()
+    matcher.match_many([r[0] for r in rows], [r[1] for r in rows])
+    results.append(('RuleMatcher.match_many', len(rows), time.perf_counter() - start))
+
+    body = nav_history(64, date(2023, 1, 1), date(2024, 12, 31)).decode()
+    start = time.perf_counter()
+    nav_df = mf_nav_util.parse_amfi_nav_data(body)
+    results.append(('parse_amfi_nav_data', len(nav_df), time.perf_counter() - start))
+    # Ten years of NAVs, so the payload dwarfs the parser's fixed overhead
+    memory = parse_peak_memory(nav_history(64, date(2015, 1, 1), date(2024, 12, 31)))
+
+    server.reset()
+    days = [(date(2024, 1, 1) + timedelta(days=i)).strftime('%d/%m/%Y') for i in range(365)]
+    lookups = [days[i % len(days)] for i in range(20000)]
+    start = time.perf_counter()
+    mf_nav_util.prefetch_navs((64, mf_nav_util.get_nav_date(day)) for day in set(lookups))
+    for day in lookups:
+        mf_nav_util.get_nav_for_date(64, '64001', day)
+    results.append(('get_nav_for_date', len(lookups), time.perf_counter() - start))
+    return results, server.requests, memory
+
+
+def nav_fetch_benchmark(server, workers, mf_numbers=8, months=12):
+    """Times fetch_nav_ranges over monthly ranges of `mf_numbers` fund houses,
+    serially and with `workers` threads, against the mock server.
+
+    Returns [(max_workers, ranges, seconds, requests)].
+    """
+    sys.path.insert(0, REPO_DIR)
+    import calendar
+    import contextlib
+    import io
+    import mf_nav_util
+
+    ranges = [(mf_number, f'01-{calendar.month_abbr[month]}-2024',
+               f'{calendar.monthrange(2024, month)[1]:02d}-{calendar.month_abbr[month]}-2024')
+              for mf_number in range(1, mf_numbers + 1) for month in range(1, months + 1)]
+    results = []
+    for max_workers in (1, workers):
+        mf_nav_util.nav_cache.clear()
+        mf_nav_util.nav_indexes.clear()
+        mf_nav_util.nav_cache_ranges.clear()
+        server.reset()
+        start = time.perf_counter()
+        # fetch_nav_data reports every download
+        with contextlib.redirect_stdout(io.StringIO()):
+            mf_nav_util.fetch_nav_ranges(ranges, max_workers=max_workers)
+        results.append((max_workers, len(ranges), time.perf_counter() - start, server.requests))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the converters and the rule generator.")
+    parser.add_argument('--sizes', default='1k,100k', help="statement row counts (default: %(default)s)")
+    parser.add_argument('--rules', default='50x25',
+                        help="rule files as ACCOUNTSxPATTERNS, comma separated (default: %(default)s)")
+    parser.add_argument('--books', default='5k', help="book transaction counts; empty to skip (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.05, help="mock NAV server latency in seconds")
+    parser.add_argument('--legacy-max-rows', type=int, default=20000,
+                        help="skip convert.py --compat v1 on larger statements; it downloads a NAV window "
+                             "per purchase date (default: %(default)s). It only runs with the first --rules size")
+    parser.add_argument('--skip-legacy', action='store_true', help="don't run convert.py --compat v1")
+    parser.add_argument('--micro', action='store_true',
+                        help="also time rule matching, NAV parsing and NAV lookup in-process, and compare the "
+                             "peak memory of string and streamed NAV parsing")
+    parser.add_argument('--nav-fetch', type=int, metavar='WORKERS', nargs='?', const=8, default=None,
+                        help="also time fetch_nav_ranges against the mock server with 1 and WORKERS threads "
+                             "(default WORKERS: 8)")
+    parser.add_argument('--data-dir', default=None,
+                        help="where generated inputs are kept and reused (default: a temporary directory)")
+    parser.add_argument('--json', metavar='FILE', default=None, help="write the results as JSON")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='gnusplitcash-bench-')
+    os.makedirs(data_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix='gnusplitcash-bench-run-')
+    sizes = [parse_count(size) for size in args.sizes.split(',') if size]
+    rule_sizes = [tuple(int(n) for n in spec.split('x')) for spec in args.rules.split(',') if spec]
+    book_sizes = [parse_count(size) for size in args.books.split(',') if size]
+
+    server = MockAmfiServer(args.latency).start()
+    env = dict(os.environ, AMFI_NAV_HISTORY_URL=server.url, GNUSPLITCASH_NAV_STORE='')
+    # In-process NAV code reads these at import time
+    os.environ.update(AMFI_NAV_HISTORY_URL=server.url, GNUSPLITCASH_NAV_STORE='')
+    results = []
+
+    def record(name, input_name, rows, command, cwd):
+        server.reset()
+        seconds, peak_mb, status, tail = run_process(command, cwd, env)
+        result = {
+            'benchmark': name, 'input': input_name, 'rows': rows, 'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds) if seconds else None, 'peak_rss_mb': round(peak_mb, 1),
+            'nav_requests': server.requests, 'exit_status': status,
+        }
+        if status != 0:
+            result['error'] = tail
+        results.append(result)
+        print(f"{name:<24} {input_name:<28} {rows:>9} {seconds:>8.2f}s {result['rows_per_second'] or 0:>9}/s "
+              f"{peak_mb:>8.1f} MB {server.requests:>5} req" + (f"  FAILED: {tail}" if status else ''), flush=True)
+
+    try:
+        print(f"{'benchmark':<24} {'input':<28} {'rows':>9} {'time':>9} {'rows/s':>11} {'peak RSS':>11} {'NAV':>9}")
+        for rows in sizes:
+            statement = cached_input(data_dir, f'statement_{rows}.csv', lambda p, n=rows: make_statement(p, n))
+            for accounts, patterns in rule_sizes:
+                rules = cached_input(data_dir, f'rules_{accounts}x{patterns}.yaml',
+                                     lambda p, a=accounts, n=patterns: make_rules(p, a, n))
+                input_name = f'{rows} rows, {accounts}x{patterns} rules'
+                record('convert_v2.py', input_name, rows,
+                       [sys.executable, os.path.join(REPO_DIR, 'convert_v2.py'), statement, rules,
+                        '--seed', '1', '--no-rules-cache'], work_dir)
+                # The v1 output comes from the same pipeline, so one rule
+                # file is enough to compare the two
+                legacy = (accounts, patterns) == rule_sizes[0] and rows <= args.legacy_max_rows
+                if legacy and not args.skip_legacy:
+                    record('convert.py --compat v1', input_name, rows,
+                           [sys.executable, os.path.join(REPO_DIR, 'convert.py'), statement, rules,
+                            '--compat', 'v1', '--no-rules-cache'], work_dir)
+        for transactions in book_sizes:
+            book = cached_input(data_dir, f'book_{transactions}.gnucash',
+                                lambda p, n=transactions: make_book(p, n))
+            output = os.path.join(work_dir, 'generated_rules.yaml')
+            record('generate_account_rules', f'{transactions} transactions', transactions,
+                   [sys.executable, os.path.join(REPO_DIR, 'generate_account_rules.py'), book, output], work_dir)
+        if args.micro and sizes and rule_sizes:
+            statement = os.path.join(data_dir, f'statement_{sizes[0]}.csv')
+            rules = os.path.join(data_dir, f'rules_{rule_sizes[0][0]}x{rule_sizes[0][1]}.yaml')
+            micro, nav_requests, memory = micro_benchmarks(server, statement, rules)
+            print()
+            for name, count, seconds in micro:
+                print(f"{name:<24} {count:>9} items {seconds:>8.3f}s {count / seconds:>11.0f}/s")
+                results.append({'benchmark': name, 'rows': count, 'seconds': round(seconds, 4),
+                                'rows_per_second': round(count / seconds)})
+            print(f"get_nav_for_date NAV requests: {nav_requests}")
+            for name, count, peak in memory:
+                print(f"{name:<24} {count:>9} rows  {peak / (1024 * 1024):>8.2f} MB peak (tracemalloc)")
+                results.append({'benchmark': f'{name} memory', 'rows': count,
+                                'peak_traced_mb': round(peak / (1024 * 1024), 2)})
+        if args.nav_fetch:
+            print()
+            serial_seconds = None
+            for max_workers, ranges, seconds, requests in nav_fetch_benchmark(server, args.nav_fetch):
+                serial_seconds = serial_seconds or seconds
+                name = f'fetch_nav_ranges x{max_workers}'
+                print(f"{name:<24} {ranges:>9} ranges {seconds:>7.3f}s {requests:>5} req "
+                      f"{serial_seconds / seconds:>6.1f}x")
+                results.append({'benchmark': name, 'rows': ranges, 'seconds': round(seconds, 4),
+                                'nav_requests': requests, 'latency': args.latency})
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'latency': args.latency,
+                       'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Startup benchmark for the converter CLIs.
+
+Runs each command in a fresh interpreter with `-X importtime` and reports
+the wall time and the total and heaviest imports.
+
+    python benchmarks/startup.py [--repeat N] [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    'python (baseline)': ['-c', 'pass'],
+    'import convert_v2': ['-c', 'import convert_v2'],
+    'convert_v2 --help': ['convert_v2.py', '--help'],
+    'convert_batch --help': ['convert_batch.py', '--help'],
+    'import mf_nav_util': ['-c', 'import mf_nav_util'],
+}
+
+
+def parse_importtime(stderr):
+    """Returns {top-level package: cumulative microseconds} from -X importtime output."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only top-level entries: nested imports are indented
+        if name.startswith('  '):
+            continue
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(cumulative)
+    return totals
+
+
+def run(args, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=REPO_DIR,
+                              capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if proc.returncode != 0:
+            raise RuntimeError(f"{args} failed:\n{proc.stderr}")
+        if best is None or elapsed < best[0]:
+            best = (elapsed, parse_importtime(proc.stderr))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI startup and import time.")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per command; the fastest is kept")
+    parser.add_argument('--top', type=int, default=5, help="heaviest imports to list per command")
+    args = parser.parse_args()
+
+    for label, command in COMMANDS.items():
+        elapsed, imports = run(command, args.repeat)
+        heaviest = sorted(imports.items(), key=lambda item: -item[1])[:args.top]
+        print(f"{label}: {elapsed * 1000:.0f} ms wall, {sum(imports.values()) / 1000:.0f} ms imports")
+        for name, us in heaviest:
+            print(f"    {name:<24} {us / 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
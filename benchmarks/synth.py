@@ -0,0 +1,204 @@
+"""Synthetic inputs for the benchmarks.
+
+Statements, rule files and GnuCash books share one merchant vocabulary, so
+generated rules match a realistic share of generated statement rows. All
+generators are deterministic for a given seed.
+
+    python benchmarks/synth.py statement OUT.csv --rows 100000
+    python benchmarks/synth.py rules OUT.yaml --accounts 200 --patterns 25
+    python benchmarks/synth.py book OUT.gnucash --transactions 5000
+"""
+import argparse
+import csv
+import os
+import random
+import string
+import sys
+import uuid
+from datetime import date, timedelta
+
+import yaml
+
+STATEMENT_COLUMNS = [
+    'S No.', 'Value Date', 'Transaction Date', 'Cheque Number', 'Transaction Remarks',
+    'Withdrawal Amount (INR )', 'Deposit Amount (INR )', 'Balance (INR )',
+]
+
+# Expense account -> merchants seen in its descriptions
+MERCHANTS = {
+    'Food': ['swiggy', 'zomato', 'dominos', 'bigbasket', 'blinkit'],
+    'Rent': ['landlord', 'nobroker', 'housing'],
+    'Travel': ['uber', 'irctc', 'indigo', 'makemytrip', 'rapido'],
+    'Shopping': ['amazon', 'flipkart', 'myntra', 'ajio', 'nykaa'],
+    'Utilities': ['bescom', 'airtel', 'jio', 'bwssb', 'tatasky'],
+    'Medical': ['apollo', 'pharmeasy', 'medplus', 'practo'],
+    'Fuel': ['hpcl', 'bpcl', 'indianoil'],
+    'Education': ['byjus', 'udemy', 'coursera'],
+}
+# Words that show up in descriptions of every kind
+NOISE = ['yesb', 'okaxis', 'oksbi', 'ybl', 'paytm', 'razorpay', 'billdesk', 'imps', 'store', 'services']
+
+# The mutual fund used for price_determine rows; the mock AMFI server serves
+# scheme codes mf_number * 1000 + 1 and + 2
+MF_HOUSE = 'PPFAS'
+MF_NUMBER = 64
+MF_SCHEME_CODE = MF_NUMBER * 1000 + 1
+
+START_DATE = date(2024, 1, 1)
+DAYS = 365
+
+
+def parse_count(text):
+    """Parses '1k', '100k', '1m' or a plain number."""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def _merchant_payment(rng):
+    """Returns (expense account name, UPI description) for a random merchant payment."""
+    account = rng.choice(list(MERCHANTS))
+    merchant = rng.choice(MERCHANTS[account])
+    handle = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 9)))
+    return account, (f"UPI/{merchant}.{handle}@{rng.choice(NOISE)}/{rng.choice(NOISE)} "
+                     f"{rng.choice(NOISE)} {rng.randint(1, 10 ** 9)}/PAYMENT")
+
+
+def make_statement(path, rows, seed=0, mf_share=0.02, unmatched_share=0.1):
+    """Writes an ICICI-format statement CSV with `rows` lines.
+
+    About `mf_share` of the rows are MF purchases needing a NAV price and
+    `unmatched_share` have descriptions no generated rule matches.
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(STATEMENT_COLUMNS)
+        for i in range(rows):
+            day = (START_DATE + timedelta(days=rng.randrange(DAYS))).strftime('%d/%m/%Y')
+            kind = rng.random()
+            if kind < mf_share:
+                remarks = f"ACH/{MF_HOUSE} MUTUAL FUND/{rng.randint(1, 10 ** 9)}"
+                withdrawal, deposit = rng.choice([1000, 2500, 5000, 10000]), 0
+            elif kind < mf_share + unmatched_share:
+                remarks = f"NEFT/{rng.randint(1, 10 ** 9)}/MISC"
+                withdrawal, deposit = 0, round(rng.uniform(100, 100000), 2)
+            else:
+                _, remarks = _merchant_payment(rng)
+                withdrawal, deposit = round(rng.uniform(10, 20000), 2), 0
+            writer.writerow([i, day, day, '', remarks, withdrawal, deposit, 0])
+
+
+def make_rules(path, accounts=50, patterns=25, seed=0):
+    """Writes a rules YAML with `accounts` rules of about `patterns` patterns each.
+
+    The first rules carry the merchant vocabulary; the rest, and the filler
+    patterns padding every rule to size, are random words that never match.
+    One MF rule with price_determine and one value_conditions rule are added.
+    """
+    rng = random.Random(seed)
+    rules = [{
+        'account': f'Assets:Mutual Funds:{MF_HOUSE}',
+        'patterns': [MF_HOUSE.lower()],
+        'mutual_fund': {'fund_house': MF_HOUSE, 'amfi_scheme_code': str(MF_SCHEME_CODE), 'price_determine': True},
+    }, {
+        'account': 'Assets:Recurring Deposit',
+        'patterns': ['neft'],
+        'value_conditions': [{'amount': 5000}],
+    }]
+    merchant_accounts = list(MERCHANTS.items())
+    for i in range(accounts):
+        if i < len(merchant_accounts):
+            name, words = merchant_accounts[i]
+            account, account_patterns = f'Expenses:{name}', list(words)
+        else:
+            account, account_patterns = f'Expenses:Synthetic {i}', []
+        while len(account_patterns) < patterns:
+            account_patterns.append(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 12))))
+        rules.append({'account': account, 'patterns': account_patterns})
+    config = {
+        'mutual_funds': {MF_HOUSE: {'mf_number': MF_NUMBER, 'aliases': [MF_HOUSE.lower()]}},
+        'rules': rules,
+    }
+    with open(path, 'w') as f:
+        yaml.dump(config, f, sort_keys=False)
+
+
+def make_book(path, transactions=5000, seed=0):
+    """Writes a SQLite book of bank-to-expense transactions plus MF purchases."""
+    import warnings
+    # piecash's SQLAlchemy models warn about overlapping relationships
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        _write_book(path, transactions, seed)
+
+
+def _write_book(path, transactions, seed):
+    # Accounts through piecash, transactions through the bulk SQL BookWriter
+    import pandas as pd
+    import piecash
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from book_writer import BookWriter
+
+    rng = random.Random(seed)
+    book = piecash.create_book(sqlite_file=path, currency='INR', overwrite=True)
+    inr = book.default_currency
+    assets = piecash.Account('Assets', 'ASSET', inr, parent=book.root_account)
+    piecash.Account('Savings - ICICI', 'BANK', inr, parent=assets)
+    expenses = piecash.Account('Expenses', 'EXPENSE', inr, parent=book.root_account)
+    for name in MERCHANTS:
+        piecash.Account(name, 'EXPENSE', inr, parent=expenses)
+    fund = piecash.Commodity(namespace='FUND', mnemonic=str(MF_SCHEME_CODE), fullname=f'{MF_HOUSE} Flexi Cap',
+                             fraction=1000, book=book)
+    piecash.Account(f'{MF_HOUSE} Flexi Cap', 'MUTUAL', fund, parent=assets)
+    book.save()
+    book.close()
+
+    # Rows in convert_statement's multi-split layout
+    rows = []
+    for i in range(transactions):
+        post_date = (START_DATE + timedelta(days=i * DAYS // max(transactions, 1))).strftime('%d/%m/%Y')
+        transaction_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        if rng.random() < 0.02:
+            amount = rng.choice([1000, 2500, 5000])
+            description = f"ACH/{MF_HOUSE} MUTUAL FUND/{rng.randint(1, 10 ** 9)}"
+            counter = (f'Assets:{MF_HOUSE} Flexi Cap', amount / 50, amount, 50.0)
+        else:
+            account, description = _merchant_payment(rng)
+            amount = rng.randint(1000, 2000000) / 100
+            counter = (f'Expenses:{account}', amount, amount, '')
+        rows.append((transaction_id, post_date, description, 'Assets:Savings - ICICI', -amount, amount, ''))
+        rows.append((transaction_id, post_date, description) + counter)
+    writer = BookWriter(path, method='sql', backup=False)
+    writer.write(pd.DataFrame(rows, columns=['TransactionID', 'date', 'description', 'Full Account Name',
+                                             'Amount', 'Value', 'price']))
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark inputs.")
+    subparsers = parser.add_subparsers(dest='kind', required=True)
+    statement = subparsers.add_parser('statement', help="ICICI-format statement CSV")
+    statement.add_argument('output')
+    statement.add_argument('--rows', default='1k', help="row count, e.g. 1k, 100k, 1m")
+    rules = subparsers.add_parser('rules', help="account rules YAML")
+    rules.add_argument('output')
+    rules.add_argument('--accounts', type=int, default=50)
+    rules.add_argument('--patterns', type=int, default=25, help="patterns per account")
+    book = subparsers.add_parser('book', help="piecash SQLite book")
+    book.add_argument('output')
+    book.add_argument('--transactions', default='5k')
+    for sub in (statement, rules, book):
+        sub.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.kind == 'statement':
+        make_statement(args.output, parse_count(args.rows), args.seed)
+    elif args.kind == 'rules':
+        make_rules(args.output, args.accounts, args.patterns, args.seed)
+    else:
+        make_book(args.output, parse_count(args.transactions), args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import piecash
+from piecash import Account, Price, Split, Transaction
+from piecash.kvp import KVP_Type, Slot
+from sqlalchemy.exc import IntegrityError
+
+from profiling import count, stage
+
+# Type of accounts created by create_accounts, by top-level account name
+ROOT_ACCOUNT_TYPES = {
+    'Assets': 'ASSET',
+    'Liabilities': 'LIABILITY',
+    'Income': 'INCOME',
+    'Expenses': 'EXPENSE',
+    'Equity': 'EQUITY',
+}
+# GnuCash's own Imbalance-XXX and Orphan-XXX accounts are top-level BANK accounts
+SUSPENSE_ACCOUNT_PREFIXES = ('Imbalance-', 'Orphan-')
+
+NAV_PRICE_TYPE = 'nav'
+NAV_PRICE_SOURCE = 'user:price'
+
+# Rows per executemany() in the bulk SQL writer
+INSERT_BATCH_ROWS = 10000
+
+
+def _decimal(num, fraction):
+    return Decimal(num) / fraction
+
+
+def _guid_for(transaction_id):
+    # The TransactionID of the CSV doubles as the GnuCash guid, so a
+    # transaction can be traced back to the CSV row and can't be written twice
+    try:
+        return uuid.UUID(str(transaction_id)).hex
+    except ValueError:
+        return uuid.uuid4().hex
+
+
+def _iter_transactions(multi_split_df):
+    """Yields (TransactionID, date, description, [(account, amount, value, price)])
+    for runs of rows sharing a TransactionID, as convert_statement writes them."""
+    current_id = None
+    splits = []
+    for transaction_id, date_str, description, account, amount, value, price in zip(
+            multi_split_df['TransactionID'], multi_split_df['date'], multi_split_df['description'],
+            multi_split_df['Full Account Name'], multi_split_df['Amount'], multi_split_df['Value'],
+            multi_split_df['price']):
+        if transaction_id != current_id:
+            if splits:
+                yield current_id, current_date, current_description, splits
+            current_id, current_date, current_description, splits = transaction_id, date_str, description, []
+        splits.append((account, float(amount), float(value), price))
+    if splits:
+        yield current_id, current_date, current_description, splits
+
+
+class BookWriter:
+    """Writes converted statements straight into a GnuCash SQLite book.
+
+    Each write() adds the transactions of one multi_split frame (the
+    convert_statement output): the bank split, the counter split and the
+    stamp duty split, with MF units as the split quantity, plus a NAV entry
+    in the price database per fund and day. Everything is one database
+    transaction, committed by close(); with dry_run it is rolled back
+    instead, after the same checks and inserts.
+
+    method='sql' inserts transactions, splits and their date-posted slots
+    with bulk executemany() calls; method='orm' builds piecash objects,
+    which is several times slower but validated by piecash. Unless
+    `backup` is False, piecash copies the book aside first. Accounts must
+    exist unless create_accounts is set; fund accounts, the ones of splits
+    with a NAV price, must always exist with the scheme as their commodity,
+    as it isn't known here.
+    """
+
+    def __init__(self, book_file, dry_run=False, create_accounts=False, method='sql', backup=True):
+        self.dry_run = dry_run
+        self.create_accounts = create_accounts
+        self.method = method
+        # GnuCash keeps a lock on books it has open; refuse to write to those
+        self.book = piecash.open_book(book_file, readonly=False, open_if_lock=False, do_backup=backup and not dry_run)
+        self.currency = self.book.default_currency
+        self.accounts = {account.fullname: account for account in self.book.accounts}
+        self.created_accounts = []
+        # (commodity guid, date) of every NAV already in the price database
+        self.price_keys = {(price.commodity.guid, price.date) for price in self.book.prices}
+        self.dates = {}
+        self.transactions = 0
+        self.splits = 0
+        self.prices = 0
+
+    def _account(self, fullname, fund=False):
+        account = self.accounts.get(fullname)
+        if account is not None:
+            return account
+        if fund:
+            # A created account would hold the currency, losing the units and the NAV
+            raise ValueError(f"Fund account '{fullname}' not found in the book; create it with the "
+                             f"scheme as its commodity")
+        if not self.create_accounts:
+            raise ValueError(f"Account '{fullname}' not found in the book (use create_accounts to add it)")
+        parent = self.book.root_account
+        names = fullname.split(':')
+        if names[0].startswith(SUSPENSE_ACCOUNT_PREFIXES) and len(names) == 1:
+            account_type = 'BANK'
+        elif names[0] in ROOT_ACCOUNT_TYPES:
+            account_type = ROOT_ACCOUNT_TYPES[names[0]]
+        else:
+            raise ValueError(f"Can't tell the type of a new account '{fullname}'")
+        for depth in range(1, len(names) + 1):
+            path = ':'.join(names[:depth])
+            if path not in self.accounts:
+                self.accounts[path] = Account(names[depth - 1], account_type, self.currency, parent=parent)
+                self.created_accounts.append(path)
+            parent = self.accounts[path]
+        self.book.flush()
+        return self.accounts[fullname]
+
+    def _post_date(self, date_str):
+        post_date = self.dates.get(date_str)
+        if post_date is None:
+            post_date = self.dates[date_str] = datetime.strptime(date_str, '%d/%m/%Y').date()
+        return post_date
+
+    def _splits(self, splits):
+        """Returns [(account, value num, quantity num, price)] for one transaction.
+
+        Values are in the currency's fraction and quantities in the
+        account's; a rounding difference of a few cents goes to the counter
+        split so the transaction balances.
+        """
+        fraction = self.currency.fraction
+        result = []
+        for name, amount, value, price in splits:
+            has_price = price != '' and price is not None
+            account = self._account(name, fund=has_price)
+            if account.placeholder:
+                raise ValueError(f"Account '{name}' is a placeholder")
+            # 'Value' is unsigned; the sign comes from 'Amount'
+            value_num = round(abs(value) * fraction) * (-1 if amount < 0 else 1)
+            if account.commodity == self.currency:
+                if has_price:
+                    raise ValueError(f"Split in '{name}' has a NAV price, but the account's commodity is "
+                                     f"{self.currency.mnemonic}, not the scheme")
+                quantity_num = value_num
+            elif has_price:
+                quantity_num = round(amount * account.commodity_scu)
+            else:
+                raise ValueError(f"No price for a split in '{name}', whose commodity isn't {self.currency.mnemonic}")
+            result.append((account, value_num, quantity_num, price))
+        imbalance = sum(value_num for _, value_num, _, _ in result)
+        if imbalance:
+            if abs(imbalance) > len(result) or len(result) < 2:
+                raise ValueError(f"Splits don't balance: {[s[:3] for s in splits]}")
+            account, value_num, quantity_num, price = result[1]
+            if account.commodity == self.currency:
+                quantity_num -= imbalance
+            result[1] = (account, value_num - imbalance, quantity_num, price)
+        return result
+
+    def _add_price(self, account, post_date, price):
+        key = (account.commodity.guid, post_date)
+        if key in self.price_keys:
+            return
+        self.price_keys.add(key)
+        Price(commodity=account.commodity, currency=self.currency, date=post_date,
+              value=Decimal(str(price)), type=NAV_PRICE_TYPE, source=NAV_PRICE_SOURCE)
+        self.prices += 1
+
+    def write(self, multi_split_df):
+        """Adds the transactions of a convert_statement frame to the book."""
+        with stage('book.write'):
+            if self.method == 'orm':
+                self._write_orm(multi_split_df)
+            else:
+                self._write_sql(multi_split_df)
+
+    def _write_orm(self, multi_split_df):
+        fraction = self.currency.fraction
+        for transaction_id, date_str, description, splits in _iter_transactions(multi_split_df):
+            post_date = self._post_date(date_str)
+            orm_splits = []
+            for account, value_num, quantity_num, price in self._splits(splits):
+                if account.commodity == self.currency:
+                    orm_splits.append(Split(account, value=_decimal(value_num, fraction)))
+                else:
+                    orm_splits.append(Split(account, value=_decimal(value_num, fraction),
+                                            quantity=_decimal(quantity_num, account.commodity_scu)))
+                    self._add_price(account, post_date, price)
+            transaction = Transaction(self.currency, description=description, post_date=post_date,
+                                      splits=orm_splits)
+            transaction.guid = _guid_for(transaction_id)
+            self.transactions += 1
+            self.splits += len(orm_splits)
+        self.book.flush()
+
+    def _write_sql(self, multi_split_df):
+        fraction = self.currency.fraction
+        enter_date = datetime.now().replace(microsecond=0)
+        transaction_rows = []
+        split_rows = []
+        slot_rows = []
+        for transaction_id, date_str, description, splits in _iter_transactions(multi_split_df):
+            post_date = self._post_date(date_str)
+            guid = _guid_for(transaction_id)
+            transaction_rows.append({
+                'guid': guid, 'currency_guid': self.currency.guid, 'num': '',
+                'post_date': post_date, 'enter_date': enter_date, 'description': description,
+            })
+            # The same date-posted slot piecash and GnuCash write
+            slot_rows.append({
+                'obj_guid': guid, 'name': 'date-posted', 'slot_type': KVP_Type.KVP_TYPE_GDATE,
+                'int64_val': 0, 'string_val': None, 'double_val': 0.0, 'timespec_val': None, 'guid_val': None,
+                'numeric_val_num': 0, 'numeric_val_denom': 1, 'gdate_val': post_date,
+            })
+            for account, value_num, quantity_num, price in self._splits(splits):
+                is_currency = account.commodity == self.currency
+                split_rows.append({
+                    'guid': uuid.uuid4().hex, 'tx_guid': guid, 'account_guid': account.guid,
+                    'memo': '', 'action': '', 'reconcile_state': 'n', 'reconcile_date': None,
+                    'value_num': value_num, 'value_denom': fraction,
+                    'quantity_num': quantity_num,
+                    'quantity_denom': fraction if is_currency else account.commodity_scu,
+                    'lot_guid': None,
+                })
+                if not is_currency:
+                    self._add_price(account, post_date, price)
+
+        # Same database transaction as the ORM session, so close() commits
+        # or rolls back everything together
+        connection = self.book.session.connection()
+        for table, rows in ((Transaction.__table__, transaction_rows), (Split.__table__, split_rows),
+                            (Slot.__table__, slot_rows)):
+            for start in range(0, len(rows), INSERT_BATCH_ROWS):
+                try:
+                    connection.execute(table.insert(), rows[start:start + INSERT_BATCH_ROWS])
+                except IntegrityError:
+                    raise ValueError("A TransactionID is already in the book; was this statement written before?")
+        self.transactions += len(transaction_rows)
+        self.splits += len(split_rows)
+
+    def close(self):
+        """Commits (or, on a dry run, rolls back) and closes the book.
+
+        Returns (transactions, splits, prices, created account names).
+        """
+        try:
+            with stage('book.commit'):
+                if self.dry_run:
+                    self.book.session.rollback()
+                else:
+                    self.book.save()
+        finally:
+            self.book.close()
+        count('book transactions', self.transactions)
+        count('book splits', self.splits)
+        count('book prices', self.prices)
+        return self.transactions, self.splits, self.prices, self.created_accounts
+
+    def abort(self):
+        self.book.session.rollback()
+        self.book.close()
@@ -0,0 +1,501 @@
+import argparse
+import os
+import random
+import sys
+import uuid
+from itertools import islice
+
+from profiling import count, enable_profiling, get_profiler, stage
+from rules_cache import load_rule_matcher
+from statement_formats import STATEMENT_FORMATS, detect_format, format_dates, read_statement
+
+# numpy and pandas are imported where a statement is converted, and the NAV
+# subsystem (mf_nav_util, requests) only when a matched rule needs NAV
+# prices, so --help and statements without MF rows start quickly.
+
+# Bank account of statements whose format names none
+BANK_ACCOUNT = 'Assets:Current Assets:Savings - ICICI'
+STAMP_DUTY_ACCOUNT = 'Expenses:Taxes:Mutual Fund Purchase Stamp Duty'
+UNMATCHED_ACCOUNT = 'Imbalance-INR'
+OUTPUT_COLUMNS = ['TransactionID', 'date', 'description', 'Full Account Name', 'Amount', 'Value', 'price']
+
+# convert.py's original output, kept for --compat v1
+V1_BANK_ACCOUNT = 'Assets:Current Assets: Savings'
+V1_UNMATCHED_ACCOUNT = 'Expenses:Unknown'
+V1_OUTPUT_COLUMNS = ['date', 'description', 'Full Account Name', 'Amount', 'Value', 'price']
+COMPAT_MODES = ['v1']
+
+
+def iter_transaction_ids(seed=None):
+    """Yields UUID4 strings; a seed makes the sequence reproducible."""
+    if seed is None:
+        while True:
+            yield str(uuid.uuid4())
+    rng = random.Random(seed)
+    while True:
+        yield str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def bank_account_for(input_file, statement_format=None, account=None):
+    """Returns the GnuCash account of a statement's bank splits.
+
+    That is `account` if given, else the account of the statement's format
+    (named or detected from its header), else BANK_ACCOUNT.
+    """
+    if account:
+        return account
+    return detect_format(input_file, statement_format)[0].account or BANK_ACCOUNT
+
+
+def convert_statement(bank_df, matcher, mutual_funds, transaction_ids, nav_workers=None, bank_account=BANK_ACCOUNT):
+    """Converts a statement frame (statement_formats.read_statement) into GnuCash multi-split rows.
+
+    Returns (multi_split_df, unmatched_count). Each statement line gives a
+    split in `bank_account`, a counter split and, for MF purchases with a
+    resolved NAV, a stamp duty split, in that order. MF redemptions take
+    units out of the fund and have no stamp duty. NAV history is downloaded
+    with up to `nav_workers` parallel requests (default:
+    mf_nav_util.NAV_FETCH_WORKERS).
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = bank_df.shape[0]
+    days = bank_df['date'].to_numpy(dtype='datetime64[D]')
+    dates = format_dates(days)
+    descriptions = bank_df['description'].to_numpy(dtype=object)
+    withdrawal = bank_df['withdrawal'].to_numpy(dtype=float)
+    deposit = bank_df['deposit'].to_numpy(dtype=float)
+    is_withdrawal = withdrawal > 0
+    value = np.where(is_withdrawal, withdrawal, deposit)
+    bank_amount = np.where(is_withdrawal, -value, value)
+    transaction_ids = np.asarray(transaction_ids, dtype=object)
+
+    memo_hits, memo_misses = matcher.memo_hits, matcher.memo_misses
+    with stage('convert.match'):
+        rules = matcher.match_many(descriptions, value)
+    count('match memo hits', matcher.memo_hits - memo_hits)
+    count('match memo misses', matcher.memo_misses - memo_misses)
+    profiler = get_profiler()
+    if profiler is not None:
+        # Profiling overhead, kept out of convert.match
+        with stage('convert.pattern_costs'):
+            profiler.add_pattern_costs(matcher.pattern_costs(descriptions))
+
+    counter_account = np.full(n, UNMATCHED_ACCOUNT, dtype=object)
+    counter_amount = -bank_amount
+    counter_value = value.copy()
+    counter_price = np.full(n, '', dtype=object)
+    unmatched = 0
+    # (row, mf_number, amfi_scheme_code) for rows needing a NAV price
+    nav_lookups = []
+
+    for i, rule in enumerate(rules):
+        if rule is None:
+            unmatched += 1
+            continue
+        counter_account[i] = rule['account']
+        if 'mutual_fund' in rule and rule['mutual_fund'].get('price_determine', False):
+            fund_house = rule['mutual_fund']['fund_house']
+            amfi_scheme_code = rule['mutual_fund']['amfi_scheme_code']
+            if fund_house not in mutual_funds:
+                print(f"Warning: Fund house '{fund_house}' not found in mutual_funds mapping.")
+                mf_number = None
+            else:
+                mf_number = mutual_funds[fund_house]['mf_number']
+            if mf_number:
+                nav_lookups.append((i, mf_number, amfi_scheme_code))
+
+    resolved_navs = []
+    if nav_lookups:
+        from mf_nav_util import (NAV_FETCH_WORKERS, get_imported_navs, get_nav_dates, get_navs_for_dates,
+                                 prefetch_navs)
+
+        nav_dates = get_nav_dates(days[[i for i, _, _ in nav_lookups]])
+        lookups = [(mf_number, amfi_scheme_code, nav_date)
+                   for (_, mf_number, amfi_scheme_code), nav_date in zip(nav_lookups, nav_dates)]
+        # NAVs imported from bulk files need no download
+        with stage('convert.nav_imported'):
+            imported = get_imported_navs(lookups)
+        pending = [pos for pos in range(len(lookups)) if pos not in imported]
+        # Fetch every other NAV the statement needs in as few requests as possible
+        with stage('convert.nav_prefetch'):
+            prefetch_navs(
+                ((lookups[pos][0], lookups[pos][2]) for pos in pending),
+                max_workers=nav_workers or NAV_FETCH_WORKERS,
+            )
+        with stage('convert.nav_lookup'):
+            fetched = get_navs_for_dates([lookups[pos] for pos in pending])
+        resolved_navs = [imported.get(pos) for pos in range(len(lookups))]
+        for pos, nav_price in zip(pending, fetched):
+            resolved_navs[pos] = nav_price
+        count('nav lookups', len(nav_lookups))
+
+    stamp_rows = []
+    nav_prices = []
+    redemption_rows = []
+    redemption_navs = []
+    for (i, _, _), nav_price in zip(nav_lookups, resolved_navs):
+        if nav_price:
+            counter_price[i] = nav_price
+            if is_withdrawal[i]:
+                stamp_rows.append(i)
+                nav_prices.append(nav_price)
+            else:
+                redemption_rows.append(i)
+                redemption_navs.append(nav_price)
+
+    # MF purchases: deduct stamp duty of 0.005% and convert the rest to units
+    stamp_rows = np.asarray(stamp_rows, dtype=np.intp)
+    nav_prices = np.asarray(nav_prices, dtype=float)
+    stamp_duty = value[stamp_rows] * (0.005 / 100)
+    counter_value[stamp_rows] = value[stamp_rows] - stamp_duty
+    counter_amount[stamp_rows] = counter_value[stamp_rows] / nav_prices
+    # Redemptions (deposits from the fund) take units out, without stamp duty
+    redemption_rows = np.asarray(redemption_rows, dtype=np.intp)
+    counter_amount[redemption_rows] = -value[redemption_rows] / np.asarray(redemption_navs, dtype=float)
+
+    columns = {
+        'TransactionID': np.concatenate([transaction_ids, transaction_ids, transaction_ids[stamp_rows]]),
+        'date': np.concatenate([dates, dates, dates[stamp_rows]]),
+        'description': np.concatenate([descriptions, descriptions, descriptions[stamp_rows]]),
+        'Full Account Name': np.concatenate([
+            np.full(n, bank_account, dtype=object),
+            counter_account,
+            np.full(len(stamp_rows), STAMP_DUTY_ACCOUNT, dtype=object),
+        ]),
+        'Amount': np.concatenate([bank_amount, counter_amount, stamp_duty]),
+        'Value': np.concatenate([value, counter_value, stamp_duty]),
+        'price': np.concatenate([np.full(n, '', dtype=object), counter_price, np.full(len(stamp_rows), '', dtype=object)]),
+    }
+    # Interleave bank, counter and stamp duty splits per transaction
+    order_key = np.concatenate([np.arange(n) * 3, np.arange(n) * 3 + 1, stamp_rows * 3 + 2])
+    order = np.argsort(order_key, kind='stable')
+    multi_split_df = pd.DataFrame({name: column[order] for name, column in columns.items()}, columns=OUTPUT_COLUMNS)
+    return multi_split_df, unmatched
+
+
+def convert_statement_v1(bank_df, matcher, mutual_funds, nav_workers=None):
+    """convert.py's original conversion, for --compat v1.
+
+    Returns (multi_split_df, unmatched_count) with a bank and a counter
+    split per statement line and no TransactionID or stamp duty. Rules are
+    tried in file order (RuleMatcher.match with in_order), and the NAV is
+    the latest on or before the transaction date itself, from a +-7 day
+    download window (mf_nav_util.get_navs_in_windows).
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = bank_df.shape[0]
+    days = bank_df['date'].to_numpy(dtype='datetime64[D]')
+    dates = format_dates(days)
+    descriptions = bank_df['description'].to_numpy(dtype=object)
+    withdrawal = bank_df['withdrawal'].to_numpy(dtype=float)
+    deposit = bank_df['deposit'].to_numpy(dtype=float)
+    is_withdrawal = withdrawal > 0
+    value = np.where(is_withdrawal, withdrawal, deposit)
+    bank_amount = np.where(is_withdrawal, -value, value)
+
+    with stage('convert.match'):
+        rules = matcher.match_many(descriptions, value, in_order=True)
+
+    counter_account = np.full(n, V1_UNMATCHED_ACCOUNT, dtype=object)
+    counter_amount = -bank_amount
+    counter_price = np.full(n, '', dtype=object)
+    unmatched = 0
+    nav_lookups = []
+    for i, rule in enumerate(rules):
+        if rule is None:
+            unmatched += 1
+            continue
+        counter_account[i] = rule['account']
+        if 'mutual_fund' in rule and rule['mutual_fund'].get('price_determine', False):
+            fund_house = rule['mutual_fund']['fund_house']
+            if fund_house not in mutual_funds:
+                print(f"Warning: Fund house '{fund_house}' not found in mutual_funds mapping.")
+                continue
+            nav_lookups.append((i, mutual_funds[fund_house]['mf_number'], rule['mutual_fund']['amfi_scheme_code']))
+
+    if nav_lookups:
+        from mf_nav_util import NAV_FETCH_WORKERS, get_navs_in_windows
+
+        with stage('convert.nav_lookup'):
+            navs = get_navs_in_windows(
+                [(mf_number, amfi_scheme_code, days[i].astype(object))
+                 for i, mf_number, amfi_scheme_code in nav_lookups],
+                max_workers=nav_workers or NAV_FETCH_WORKERS)
+        count('nav lookups', len(nav_lookups))
+        for (i, _, _), nav_price in zip(nav_lookups, navs):
+            if nav_price:
+                counter_price[i] = nav_price
+                counter_amount[i] = value[i] / nav_price
+
+    columns = {
+        'date': np.concatenate([dates, dates]),
+        'description': np.concatenate([descriptions, descriptions]),
+        'Full Account Name': np.concatenate([np.full(n, V1_BANK_ACCOUNT, dtype=object), counter_account]),
+        'Amount': np.concatenate([bank_amount, counter_amount]),
+        'Value': np.concatenate([value, value]),
+        'price': np.concatenate([np.full(n, '', dtype=object), counter_price]),
+    }
+    # Bank split, then counter split, per transaction
+    order = np.arange(2 * n).reshape(2, n).T.ravel()
+    multi_split_df = pd.DataFrame({name: column[order] for name, column in columns.items()}, columns=V1_OUTPUT_COLUMNS)
+    return multi_split_df, unmatched
+
+
+def bank_splits(bank_df):
+    """Returns (dates, signed amounts, descriptions) of a statement frame's bank splits,
+    as duplicate_index.DuplicateIndex takes them."""
+    import numpy as np
+
+    dates = bank_df['date'].to_numpy(dtype='datetime64[D]').astype(object)
+    descriptions = bank_df['description'].to_numpy(dtype=object)
+    withdrawal = bank_df['withdrawal'].to_numpy(dtype=float)
+    deposit = bank_df['deposit'].to_numpy(dtype=float)
+    return dates, np.where(withdrawal > 0, -withdrawal, deposit), descriptions
+
+
+def drop_duplicates(bank_df, duplicate_index, action='skip'):
+    """Checks statement rows against a duplicate_index.DuplicateIndex.
+
+    Returns bank_df without the rows already in the book ('skip'), or
+    unchanged after printing them ('flag').
+    """
+    import numpy as np
+
+    dates, bank_amount, descriptions = bank_splits(bank_df)
+    is_duplicate = np.array(duplicate_index.mark(dates, bank_amount, descriptions), dtype=bool)
+    count('duplicate rows', int(is_duplicate.sum()))
+    if action == 'flag':
+        for i in np.flatnonzero(is_duplicate):
+            print(f"Already in the book: {dates[i]:%d/%m/%Y} {bank_amount[i]:.2f} {descriptions[i]}")
+        return bank_df
+    return bank_df[~is_duplicate]
+
+
+def convert_file(input_file, output_file, matcher, mutual_funds, chunksize=None, seed=None, nav_workers=None,
+                 book_writer=None, duplicate_index=None, duplicates='skip', compat=None, statement_format=None,
+                 bank_account=None):
+    """Converts one bank statement (CSV or Excel) into a GnuCash multi-split CSV.
+
+    The statement is read with statement_formats.read_statement, in the
+    named `statement_format` or the one detected from its header. With
+    `chunksize` it is read, converted and appended to `output_file` that
+    many rows at a time. With a book_writer.BookWriter the transactions go
+    into its book instead and no CSV is written. Rows found in
+    `duplicate_index` are skipped or flagged, as `duplicates` says (see
+    drop_duplicates), and rows written to the book are added to it. The
+    index must be of the statement's bank account, which is `bank_account`
+    or else bank_account_for's. compat='v1' converts with
+    convert_statement_v1 instead. Returns (total, unmatched).
+    """
+    import pandas as pd
+
+    if compat != 'v1':
+        bank_account = bank_account_for(input_file, statement_format, bank_account)
+        if duplicate_index is not None and duplicate_index.account not in (None, bank_account):
+            raise ValueError(f"The duplicate index is of '{duplicate_index.account}', "
+                             f"but the statement's bank account is '{bank_account}'")
+
+    # A generator, so every read is timed by the 'read' stage below
+    chunks = read_statement(input_file, statement_format, chunksize)
+    transaction_ids = iter_transaction_ids(seed)
+    total_transactions = 0
+    unmatched_transactions = 0
+    written = False
+    while True:
+        with stage('read'):
+            bank_df = next(chunks, None)
+        if bank_df is None:
+            break
+        if duplicate_index is not None:
+            with stage('dedupe'):
+                bank_df = drop_duplicates(bank_df, duplicate_index, duplicates)
+        with stage('convert'):
+            if compat == 'v1':
+                multi_split_df, unmatched = convert_statement_v1(bank_df, matcher, mutual_funds, nav_workers)
+            else:
+                multi_split_df, unmatched = convert_statement(
+                    bank_df, matcher, mutual_funds, list(islice(transaction_ids, bank_df.shape[0])), nav_workers,
+                    bank_account)
+        # Export as CSV, appending every chunk after the first
+        with stage('write'):
+            if book_writer is not None:
+                book_writer.write(multi_split_df)
+                if duplicate_index is not None:
+                    duplicate_index.add(*bank_splits(bank_df), accounts=multi_split_df['Full Account Name'])
+            else:
+                multi_split_df.to_csv(output_file, index=False, mode='a' if written else 'w', header=not written)
+        written = True
+        total_transactions += bank_df.shape[0]
+        unmatched_transactions += unmatched
+    if not written and book_writer is None:
+        pd.DataFrame(columns=V1_OUTPUT_COLUMNS if compat == 'v1' else OUTPUT_COLUMNS).to_csv(output_file, index=False)
+    return total_transactions, unmatched_transactions
+
+
+def build_arg_parser(description, rules_default=None):
+    """Returns the argument parser shared by convert.py and convert_v2.py.
+
+    With a `rules_default` the rules file argument becomes optional.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('input_file', help="bank statement CSV or Excel export")
+    if rules_default is None:
+        parser.add_argument('rules_file', help="account rules YAML")
+    else:
+        parser.add_argument('rules_file', nargs='?', default=rules_default,
+                            help="account rules YAML (default: %(default)s)")
+    parser.add_argument('--compat', choices=COMPAT_MODES, default=None,
+                        help="reproduce an earlier converter: v1 is convert.py's original two-split output, "
+                             "rule order and +-7 day NAV lookup")
+    parser.add_argument('--format', dest='statement_format', choices=sorted(STATEMENT_FORMATS), default=None,
+                        help="bank of the statement (default: detected from its columns)")
+    parser.add_argument('--account', default=None,
+                        help="GnuCash account of the bank splits, also the one checked for duplicates "
+                             "(default: the format's, e.g. 'Assets:Current Assets:Savings - HDFC')")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for TransactionID generation, for reproducible output")
+    parser.add_argument('--nav-workers', type=int, default=None,
+                        help="parallel NAV history downloads (default: 8)")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="convert the statement N rows at a time to bound memory use")
+    parser.add_argument('--no-rules-cache', action='store_true',
+                        help="parse the rules YAML without reading or writing its compiled cache")
+    parser.add_argument('--holidays', metavar='FILE', default=None,
+                        help="YAML of market holidays per year for NAV dates (default: $GNUSPLITCASH_HOLIDAYS "
+                             "or the built-in list)")
+    parser.add_argument('--match-memo-size', type=int, default=None,
+                        help="distinct descriptions whose rule matches are remembered; 0 disables (default: 50000)")
+    parser.add_argument('--book', metavar='GNUCASH_FILE', default=None,
+                        help="write the transactions straight into this GnuCash SQLite book instead of the CSV")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="with --book: do all checks and inserts, then roll back instead of saving")
+    parser.add_argument('--create-accounts', action='store_true',
+                        help="with --book: create accounts missing from the book (not fund accounts)")
+    parser.add_argument('--book-method', choices=['sql', 'orm'], default='sql',
+                        help="with --book: insert with bulk SQL (default) or through the piecash ORM")
+    parser.add_argument('--dedupe-book', metavar='GNUCASH_FILE', default=None,
+                        help="check statement rows against the transactions of this book (default: the --book file)")
+    parser.add_argument('--duplicates', choices=['skip', 'flag', 'keep'], default='skip',
+                        help="rows already in the book: leave them out (default), keep them but list them, "
+                             "or don't check")
+    parser.add_argument('--profile', action='store_true',
+                        help="print wall time and call counts per pipeline stage")
+    parser.add_argument('--profile-json', metavar='FILE', default=None,
+                        help="also write the stage timings as JSON (implies --profile)")
+    parser.add_argument('--profile-cprofile', metavar='FILE', default=None,
+                        help="also write cProfile stats of the main thread (implies --profile)")
+    return parser
+
+
+def run(args):
+    """Runs a conversion from parsed build_arg_parser() arguments."""
+
+    input_file = args.input_file
+    if not os.path.isfile(input_file):
+        print(f"Error: File '{input_file}' does not exist.")
+        sys.exit(1)
+
+    rules_file = args.rules_file
+    if not os.path.isfile(rules_file):
+        print(f"Error: File '{rules_file}' does not exist.")
+        sys.exit(1)
+
+    try:
+        bank_account = bank_account_for(input_file, args.statement_format, args.account)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.compat == 'v1' and (args.book or args.dedupe_book or args.account):
+        print("Error: --compat v1 only writes the CSV to its own bank account; --book, --dedupe-book and "
+              "--account need the current output.")
+        sys.exit(1)
+
+    if args.holidays:
+        if not os.path.isfile(args.holidays):
+            print(f"Error: File '{args.holidays}' does not exist.")
+            sys.exit(1)
+        from nav_calendar import use_holiday_file
+        use_holiday_file(args.holidays)
+
+    profiler = None
+    cprofile = None
+    if args.profile or args.profile_json or args.profile_cprofile:
+        profiler = enable_profiling()
+        profiler.meta.update(input_file=input_file, rules_file=rules_file, chunksize=args.chunksize)
+    if args.profile_cprofile:
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+
+    with stage('load_rules'):
+        matcher, mutual_funds = load_rule_matcher(rules_file, use_cache=not args.no_rules_cache)
+    if args.match_memo_size is not None:
+        matcher.memo_size = args.match_memo_size
+
+    dedupe_book = args.dedupe_book or args.book
+    duplicate_index = None
+    if dedupe_book and args.duplicates != 'keep':
+        if not os.path.isfile(dedupe_book):
+            print(f"Error: File '{dedupe_book}' does not exist.")
+            sys.exit(1)
+        from duplicate_index import DuplicateIndex
+        with stage('dedupe'):
+            duplicate_index = DuplicateIndex.for_book(dedupe_book, bank_account)
+
+    output_file = "multi_split_gnucash.csv"
+    book_writer = None
+    if args.book:
+        if not os.path.isfile(args.book):
+            print(f"Error: File '{args.book}' does not exist.")
+            sys.exit(1)
+        from book_writer import BookWriter
+        book_writer = BookWriter(args.book, dry_run=args.dry_run, create_accounts=args.create_accounts,
+                                 method=args.book_method)
+        output_file = args.book
+    try:
+        total_transactions, unmatched_transactions = convert_file(
+            input_file, output_file, matcher, mutual_funds,
+            chunksize=args.chunksize, seed=args.seed, nav_workers=args.nav_workers, book_writer=book_writer,
+            duplicate_index=duplicate_index, duplicates=args.duplicates, compat=args.compat,
+            statement_format=args.statement_format, bank_account=bank_account)
+    except ValueError as e:
+        if book_writer is None:
+            raise
+        book_writer.abort()
+        print(f"Error: {e}; nothing was written to {args.book}.")
+        sys.exit(1)
+    if book_writer is not None:
+        transactions, splits, prices, created_accounts = book_writer.close()
+        if duplicate_index is not None and not args.dry_run and os.path.samefile(dedupe_book, args.book):
+            # The book changed, so refresh the sidecar instead of reading it all again next run
+            duplicate_index.save(args.book)
+        for account in created_accounts:
+            print(f"Created account {account}")
+        print(f"{'Dry run, rolled back' if args.dry_run else 'Saved'}: {transactions} transactions, "
+              f"{splits} splits, {prices} NAV prices")
+
+    if cprofile is not None:
+        cprofile.disable()
+        cprofile.dump_stats(args.profile_cprofile)
+    if profiler is not None:
+        profiler.meta.update(transactions=total_transactions, unmatched=unmatched_transactions)
+        print(profiler.report())
+        if matcher.memo_size > 0:
+            print(f"Match memo hit rate: {matcher.memo_hit_rate() * 100:.1f}% "
+                  f"({len(matcher.memo)} distinct descriptions)")
+        if args.profile_json:
+            profiler.write_json(args.profile_json)
+
+    if duplicate_index is not None and duplicate_index.duplicates:
+        print(f"{duplicate_index.duplicates} rows already in {dedupe_book} were "
+              f"{'left out' if args.duplicates == 'skip' else 'kept'}.")
+
+    match_percentage = round(((total_transactions-unmatched_transactions)/total_transactions)*100, 2) if total_transactions else 0.0
+    print(f"Total transactions:{total_transactions}; Unmatched:{unmatched_transactions}; Match Percentage: {match_percentage}%")
+    if not (book_writer is not None and args.dry_run):
+        print(f"Conversion complete. Output written to {output_file}")
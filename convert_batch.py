@@ -0,0 +1,188 @@
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from conversion import convert_file
+from rules_cache import load_rule_matcher
+from statement_formats import STATEMENT_FORMATS, statement_files_in
+
+# Set in each worker process by _init_worker, so the compiled rules are
+# shipped to a worker once instead of with every file
+_matcher = None
+_mutual_funds = None
+
+
+def _init_worker(matcher, mutual_funds):
+    global _matcher, _mutual_funds
+    _matcher = matcher
+    _mutual_funds = mutual_funds
+
+
+def _convert_one(input_file, output_file, chunksize, seed, nav_workers, statement_format, bank_account):
+    start = time.perf_counter()
+    total, unmatched = convert_file(input_file, output_file, _matcher, _mutual_funds,
+                                    chunksize=chunksize, seed=seed, nav_workers=nav_workers,
+                                    statement_format=statement_format, bank_account=bank_account)
+    return input_file, output_file, total, unmatched, time.perf_counter() - start
+
+
+def find_statements(inputs):
+    """Expands directories and glob patterns into a sorted list of statement files."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(statement_files_in(item))
+        else:
+            files.update(path for path in glob.glob(item) if os.path.isfile(path))
+    return sorted(files)
+
+
+def output_names(input_files):
+    """Returns the output file name of each statement: '{stem}_gnucash.csv'.
+
+    Statements sharing a stem (a/jan.csv and b/jan.csv, or jan.csv and
+    jan.xlsx) are named after their path below the inputs' common directory
+    instead, e.g. 'a_jan_csv_gnucash.csv', so no output overwrites another.
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in input_files]
+    repeated = {stem for stem in stems if stems.count(stem) > 1}
+    if not repeated:
+        return [f"{stem}_gnucash.csv" for stem in stems]
+    paths = [os.path.abspath(path) for path in input_files]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    names = [
+        f"{os.path.relpath(path, root).replace(os.sep, '_').replace('.', '_')}_gnucash.csv"
+        if stem in repeated else f"{stem}_gnucash.csv"
+        for path, stem in zip(paths, stems)
+    ]
+    if len(set(names)) < len(names):
+        raise ValueError("Statements would be written to the same output file: "
+                         + ', '.join(sorted({name for name in names if names.count(name) > 1})))
+    return names
+
+
+def merge_outputs(part_files, output_file):
+    """Concatenates converted CSVs into one file, keeping the first header only."""
+    with open(output_file, 'w', newline='') as out:
+        for i, part in enumerate(part_files):
+            with open(part, 'r', newline='') as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert many bank statements with one rules file in parallel.")
+    parser.add_argument('inputs', nargs='+', help="statement CSV or Excel files, directories or glob patterns")
+    parser.add_argument('--rules', required=True, help="account rules YAML")
+    parser.add_argument('--output-dir', default='.',
+                        help="directory for the per-statement outputs (default: current directory)")
+    parser.add_argument('--merge', metavar='OUTPUT_CSV', default=None,
+                        help="write one merged GnuCash import file instead of one file per statement")
+    parser.add_argument('--format', dest='statement_format', choices=sorted(STATEMENT_FORMATS), default=None,
+                        help="bank of the statements (default: detected per file from its columns)")
+    parser.add_argument('--account', default=None,
+                        help="GnuCash account of the bank splits (default: each statement's format's account)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="conversion processes (default: number of CPUs)")
+    parser.add_argument('--nav-workers', type=int, default=None,
+                        help="parallel NAV history downloads per process (default: 8)")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="convert each statement N rows at a time to bound memory use")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for TransactionID generation, for reproducible output")
+    parser.add_argument('--no-rules-cache', action='store_true',
+                        help="parse the rules YAML without reading or writing its compiled cache")
+    parser.add_argument('--holidays', metavar='FILE', default=None,
+                        help="YAML of market holidays per year for NAV dates (default: $GNUSPLITCASH_HOLIDAYS "
+                             "or the built-in list)")
+    parser.add_argument('--match-memo-size', type=int, default=None,
+                        help="distinct descriptions whose rule matches each process remembers; 0 disables")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.rules):
+        print(f"Error: File '{args.rules}' does not exist.")
+        sys.exit(1)
+    if args.holidays:
+        if not os.path.isfile(args.holidays):
+            print(f"Error: File '{args.holidays}' does not exist.")
+            sys.exit(1)
+        # Also exported through the environment, so worker processes see it
+        from nav_calendar import use_holiday_file
+        use_holiday_file(args.holidays)
+    input_files = find_statements(args.inputs)
+    if not input_files:
+        print("Error: No statement files found.")
+        sys.exit(1)
+
+    # Parse and compile the rules once for all workers
+    matcher, mutual_funds = load_rule_matcher(args.rules, use_cache=not args.no_rules_cache)
+    if args.match_memo_size is not None:
+        matcher.memo_size = args.match_memo_size
+
+    try:
+        names = output_names(input_files)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    start = time.perf_counter()
+    results = []
+    failed = []
+    total_rows = 0
+    total_unmatched = 0
+    # The merge parts go to a temporary directory, removed even if a worker fails
+    if args.merge:
+        work_dir_context = tempfile.TemporaryDirectory(prefix='gnusplitcash-')
+    else:
+        work_dir_context = nullcontext(args.output_dir)
+    with work_dir_context as work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+        jobs = []
+        for i, (input_file, name) in enumerate(zip(input_files, names)):
+            output_file = os.path.join(work_dir, f"{i:04d}_{name}" if args.merge else name)
+            # Distinct per-file seeds keep TransactionIDs unique across a merged file
+            seed = None if args.seed is None else f"{args.seed}:{i}"
+            jobs.append((input_file, output_file, args.chunksize, seed, args.nav_workers, args.statement_format,
+                         args.account))
+
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(matcher, mutual_funds)) as executor:
+            futures = [executor.submit(_convert_one, *job) for job in jobs]
+            for job, future in zip(jobs, futures):
+                try:
+                    input_file, output_file, total, unmatched, elapsed = future.result()
+                except Exception as e:
+                    # Keep converting the other statements and report all failures at the end
+                    print(f"Error: {job[0]}: {e}")
+                    failed.append(job[0])
+                    continue
+                results.append(output_file)
+                total_rows += total
+                total_unmatched += unmatched
+                rate = total / elapsed if elapsed > 0 else 0.0
+                print(f"{input_file}: {total} transactions, {unmatched} unmatched in {elapsed:.2f}s "
+                      f"({rate:.0f} rows/s)")
+        elapsed = time.perf_counter() - start
+
+        if args.merge and not failed:
+            merge_outputs(results, args.merge)
+            print(f"Merged output written to {args.merge}")
+    match_percentage = round(((total_rows-total_unmatched)/total_rows)*100, 2) if total_rows else 0.0
+    rate = total_rows / elapsed if elapsed > 0 else 0.0
+    print(f"Files: {len(jobs)}; Total transactions:{total_rows}; Unmatched:{total_unmatched}; "
+          f"Match Percentage: {match_percentage}%; {elapsed:.2f}s ({rate:.0f} rows/s)")
+    if failed:
+        print(f"Error: {len(failed)} of {len(jobs)} statements failed to convert: {', '.join(failed)}"
+              + ("; no merged output written" if args.merge else ""))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
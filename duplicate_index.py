@@ -0,0 +1,164 @@
+import json
+import os
+from collections import Counter
+
+from profiling import count, stage
+
+# Bump when the sidecar changes shape
+DUPLICATE_INDEX_VERSION = 2
+
+
+def normalize_description(description):
+    return ' '.join(str(description).lower().split())
+
+
+def transaction_key(date, amount, description):
+    """Key of a bank split: ISO date, signed amount in paise, normalized description."""
+    return f"{date.isoformat()}|{round(amount * 100)}|{normalize_description(description)}"
+
+
+def duplicate_index_file_for(book_file):
+    return book_file + ".dupindex.json"
+
+
+def read_book_keys(book_file, account):
+    """Returns the transaction_key of every split in `account`, from one SQL query."""
+    import piecash
+    from piecash import Split, Transaction
+    from sqlalchemy import select
+
+    book = piecash.open_book(book_file, readonly=True, open_if_lock=True, do_backup=False)
+    try:
+        try:
+            account_guid = book.accounts(fullname=account).guid
+        except KeyError:
+            return []
+        transactions_table = Transaction.__table__
+        splits_table = Split.__table__
+        query = (
+            select(transactions_table.c.post_date, transactions_table.c.description,
+                   splits_table.c.value_num, splits_table.c.value_denom)
+            .select_from(transactions_table.join(splits_table, splits_table.c.tx_guid == transactions_table.c.guid))
+            .where(splits_table.c.account_guid == account_guid)
+        )
+        with book.session.bind.connect() as conn:
+            return [transaction_key(post_date, value_num / value_denom, description or '')
+                    for post_date, description, value_num, value_denom in conn.execute(query)]
+    finally:
+        book.close()
+
+
+def _sidecar_signature(book_file):
+    stat = os.stat(book_file)
+    return {'version': DUPLICATE_INDEX_VERSION, 'book_size': stat.st_size, 'book_mtime_ns': stat.st_mtime_ns}
+
+
+def _read_sidecar(sidecar, signature):
+    """Returns the keys per account saved in `sidecar`, or {} if it is missing or stale."""
+    try:
+        with open(sidecar) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(saved, dict) or any(saved.get(name) != value for name, value in signature.items()):
+        return {}
+    return saved.get('accounts', {})
+
+
+def _write_sidecar(sidecar, signature, accounts):
+    # Write then rename so an interrupted run never leaves a truncated sidecar
+    tmp_file = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(dict(signature, accounts=accounts), f)
+        os.replace(tmp_file, sidecar)
+    except OSError:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+class DuplicateIndex:
+    """Hash index of the transactions already in a book's bank account.
+
+    Holds a count per transaction_key, so checking a statement row is one
+    dict lookup. Each match uses up one count: a statement with two
+    identical rows, of which the book has one, keeps the second.
+    """
+
+    def __init__(self, keys, account=None):
+        self.keys = keys
+        self.counts = Counter(keys)
+        self.account = account
+        self.duplicates = 0
+        # Keys of rows written to the book since, and the accounts their
+        # transactions touched, for save()
+        self.added = []
+        self.touched_accounts = set()
+        # The sidecar's keys of the book's other accounts, kept by save()
+        self.other_accounts = {}
+
+    @classmethod
+    def for_book(cls, book_file, account, use_sidecar=True):
+        """Loads the index of `account` in `book_file`.
+
+        The keys are saved per account in a sidecar next to the book and
+        reused while the book's size and modification time are unchanged;
+        otherwise they are read again from the book and the sidecar is
+        rewritten. Other accounts' keys in a current sidecar are kept.
+        """
+        signature = _sidecar_signature(book_file)
+        sidecar = duplicate_index_file_for(book_file)
+        if not use_sidecar:
+            count('dedupe sidecar misses')
+            with stage('dedupe.read_book'):
+                return cls(read_book_keys(book_file, account), account)
+        with stage('dedupe.sidecar_read'):
+            accounts = _read_sidecar(sidecar, signature)
+        if account in accounts:
+            count('dedupe sidecar hits')
+            index = cls(accounts.pop(account), account)
+        else:
+            count('dedupe sidecar misses')
+            with stage('dedupe.read_book'):
+                index = cls(read_book_keys(book_file, account), account)
+            _write_sidecar(sidecar, signature, dict(accounts, **{account: index.keys}))
+        index.other_accounts = accounts
+        return index
+
+    def add(self, dates, amounts, descriptions, accounts=()):
+        """Records statement rows just written to the book, with the same
+        arguments as mark(); they aren't matched against, only saved.
+        `accounts` are the accounts of all their splits."""
+        self.added.extend(transaction_key(date, amount, description)
+                          for date, amount, description in zip(dates, amounts, descriptions))
+        self.touched_accounts.update(accounts)
+
+    def save(self, book_file):
+        """Rewrites the sidecar of `book_file` after the added rows were committed to it.
+
+        The sidecar then holds the loaded keys plus the added ones and the
+        book's new size and modification time, so the next run doesn't read
+        the book again. Other accounts' keys are kept unless the added
+        transactions have splits in them.
+        """
+        accounts = {account: keys for account, keys in self.other_accounts.items()
+                    if account not in self.touched_accounts}
+        accounts[self.account] = self.keys + self.added
+        with stage('dedupe.sidecar_write'):
+            _write_sidecar(duplicate_index_file_for(book_file), _sidecar_signature(book_file), accounts)
+
+    def mark(self, dates, amounts, descriptions):
+        """Returns a list of booleans, True for statement rows already in the book.
+
+        dates are datetime.date values and amounts are signed bank amounts.
+        """
+        counts = self.counts
+        result = []
+        for date, amount, description in zip(dates, amounts, descriptions):
+            key = transaction_key(date, amount, description)
+            remaining = counts.get(key, 0)
+            if remaining:
+                counts[key] = remaining - 1
+            result.append(bool(remaining))
+        self.duplicates += sum(result)
+        return result
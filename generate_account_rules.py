@@ -1,7 +1,14 @@
 import piecash
+from piecash import Account, Commodity, Split, Transaction
+import hashlib
+import json
+import math
+import os
 import re
+from decimal import Decimal
+from itertools import islice
+from sqlalchemy import Column, MetaData, String, Table, literal_column, select
 import yaml
-from collections import defaultdict, Counter
 import string
 
 # Example mutual_funds mapping with aliases
@@ -15,23 +22,70 @@ MUTUAL_FUNDS_CONFIG = {
     "SBI": {"mf_number": 22, "aliases": ["sbi", "state bank of india"]},
 }
 
+# Bump when the saved rule-generation state changes shape
+RULES_STATE_VERSION = 4
+
+# Keyword budgets for the generated patterns
+DEFAULT_KEYWORDS_PER_ACCOUNT = 25
+DEFAULT_MAX_PATTERNS = 5000
+# Weighted selection only keeps a keyword that at least MIN_KEYWORD_SUPPORT
+# descriptions of its account use, that at most MAX_KEYWORD_ACCOUNT_SHARE of
+# the accounts use, and whose score beats every other account's by
+# KEYWORD_DOMINANCE times; one-off reference words and gateway noise fail these
+MIN_KEYWORD_SUPPORT = 2
+MAX_KEYWORD_ACCOUNT_SHARE = 0.5
+KEYWORD_DOMINANCE = 2.0
+
+# Tables for clean_and_extract_keywords, built once instead of per call
+STOPWORDS = frozenset([
+    'upi', 'payment', 'transaction', 'bank', 'credit', 'debit', 'auto', 'cc', 'mf', 'bpay', 'bill', 'pay', 'direct',
+    'plan', 'growth', 'sip', 'monthly', 'fund', 'mutual', 'deposit', 'recurring', 'transfer', 'online', 'paymentid',
+    'id', 'txn', 'ref', 'refid', 'transactionid', 'remarks', 'paid', 'via', 'to', 'from', 'on', 'at', 'the', 'and',
+    'for', 'of', 'in', 'a', 'an', 'with', 'by', 'is', 'as', 'or', 'this', 'that', 'it', 'be', 'are', 'was', 'were',
+    'has', 'have', 'had', 'but', 'not', 'no', 'yes', 'if', 'else', 'then', 'so', 'do', 'does', 'did', 'can', 'could',
+    'would', 'should', 'will', 'shall', 'may', 'might', 'must', 'also', 'just', 'like', 'such', 'some', 'any', 'all',
+    'each', 'every', 'other', 'more', 'most', 'many', 'much', 'few', 'several', 'one', 'two', 'three', 'four', 'five',
+    'six', 'seven', 'eight', 'nine', 'ten', "sip", "bil", "bpay", "cms"
+])
+# Punctuation and ASCII digits become spaces in one translate pass; only
+# non-ASCII descriptions need the regex for other Unicode digits
+_SEPARATORS = string.punctuation + string.digits
+_KEYWORD_TABLE = str.maketrans(_SEPARATORS, ' ' * len(_SEPARATORS))
+_DIGITS_RE = re.compile(r'\d+')
+
+# Distinct descriptions from which keyword extraction uses a process pool
+PARALLEL_MIN_DESCRIPTIONS = 100000
+KEYWORD_CHUNK_SIZE = 20000
+# Split records gathered before their new descriptions are extracted together
+RECORD_BATCH_SIZE = 200000
+
 def clean_and_extract_keywords(description):
     desc = description.lower()
-    desc = re.sub(r'\d+', ' ', desc)
-    desc = desc.translate(str.maketrans(string.punctuation, ' '*len(string.punctuation)))
-    words = desc.split()
-    stopwords = set([
-        'upi', 'payment', 'transaction', 'bank', 'credit', 'debit', 'auto', 'cc', 'mf', 'bpay', 'bill', 'pay', 'direct',
-        'plan', 'growth', 'sip', 'monthly', 'fund', 'mutual', 'deposit', 'recurring', 'transfer', 'online', 'paymentid',
-        'id', 'txn', 'ref', 'refid', 'transactionid', 'remarks', 'paid', 'via', 'to', 'from', 'on', 'at', 'the', 'and',
-        'for', 'of', 'in', 'a', 'an', 'with', 'by', 'is', 'as', 'or', 'this', 'that', 'it', 'be', 'are', 'was', 'were',
-        'has', 'have', 'had', 'but', 'not', 'no', 'yes', 'if', 'else', 'then', 'so', 'do', 'does', 'did', 'can', 'could',
-        'would', 'should', 'will', 'shall', 'may', 'might', 'must', 'also', 'just', 'like', 'such', 'some', 'any', 'all',
-        'each', 'every', 'other', 'more', 'most', 'many', 'much', 'few', 'several', 'one', 'two', 'three', 'four', 'five',
-        'six', 'seven', 'eight', 'nine', 'ten', "sip", "bil", "bpay", "cms"
-    ])
-    keywords = [w for w in words if w not in stopwords and len(w) > 2]
-    return list(sorted(set(keywords)))  # All unique keywords, sorted
+    if not desc.isascii():
+        desc = _DIGITS_RE.sub(' ', desc)
+    words = desc.translate(_KEYWORD_TABLE).split()
+    return sorted({w for w in words if len(w) > 2 and w not in STOPWORDS})  # All unique keywords, sorted
+
+def _extract_keywords_chunk(descriptions):
+    return [clean_and_extract_keywords(desc) for desc in descriptions]
+
+def extract_keywords_many(descriptions, workers=None):
+    """Returns {description: keywords} for the distinct `descriptions`.
+
+    Each distinct description is processed once; with many of them and
+    more than one worker (default: CPU count) the work is spread over a
+    process pool in chunks.
+    """
+    unique = list(dict.fromkeys(descriptions))
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(unique) >= PARALLEL_MIN_DESCRIPTIONS:
+        from concurrent.futures import ProcessPoolExecutor
+        chunks = [unique[i:i + KEYWORD_CHUNK_SIZE] for i in range(0, len(unique), KEYWORD_CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            keywords = [k for chunk in executor.map(_extract_keywords_chunk, chunks) for k in chunk]
+    else:
+        keywords = _extract_keywords_chunk(unique)
+    return dict(zip(unique, keywords))
 
 def extract_fund_house(account_name, mutual_funds):
     account_name_lower = account_name.lower()
@@ -41,63 +95,225 @@ def extract_fund_house(account_name, mutual_funds):
                 return house
     return None
 
-def generate_account_rules(gnucash_file_path, output_yaml_path):
-    book = piecash.open_book(gnucash_file_path, open_if_lock=True)
-    account_desc_map = defaultdict(list)
-    account_amount_date_map = defaultdict(list)
-    mf_accounts = set()
-    mf_amfi_map = {}
-    mf_fund_house_map = {}
-    asset_accounts = set()
+def iter_splits_orm(book, skip_guids=frozenset()):
+    """Yields (transaction guid, account fullname, account type, commodity mnemonic,
+    description, post_date, value) per split via the ORM.
 
+    Transactions whose guid is in `skip_guids` are left out.
+    """
     for txn in book.transactions:
+        if txn.guid in skip_guids:
+            continue
         desc = txn.description or ''
         txn_date = txn.post_date
         for split in txn.splits:
             acct = split.account
-            acct_name = acct.fullname
-            amount = float(split.value)
-            account_desc_map[acct_name].append(desc)
-            account_amount_date_map[acct_name].append((txn_date, amount))
-            # Use account.type for classification
-            if acct.type == "MUTUAL":
-                mf_accounts.add(acct_name)
-                mf_amfi_map[acct_name] = getattr(acct.commodity, "mnemonic", "")
-                fund_house = extract_fund_house(acct_name, MUTUAL_FUNDS_CONFIG)
-                if fund_house:
-                    mf_fund_house_map[acct_name] = fund_house
-            if acct.type == "ASSET":
-                asset_accounts.add(acct_name)
+            mnemonic = getattr(acct.commodity, "mnemonic", "") if acct.type == "MUTUAL" else None
+            yield txn.guid, acct.fullname, acct.type, mnemonic, desc, txn_date, float(split.value)
 
-    book.close()
+def _skip_guids_table(conn, skip_guids):
+    """Loads `skip_guids` into a temporary table, so the split query can leave them out."""
+    table = Table('skip_transaction_guids', MetaData(), Column('guid', String(32), primary_key=True),
+                  prefixes=['TEMPORARY'])
+    table.create(conn, checkfirst=True)
+    conn.execute(table.delete())
+    guids = list(skip_guids)
+    for start in range(0, len(guids), RECORD_BATCH_SIZE):
+        conn.execute(table.insert(), [{'guid': guid} for guid in guids[start:start + RECORD_BATCH_SIZE]])
+    return table
+
+def iter_splits_sql(book, skip_guids=frozenset()):
+    """Yields the same records as iter_splits_orm from bulk SQL queries.
+
+    Account full names are built once from the parent tree, and the
+    transaction/split join is streamed row by row without creating ORM
+    objects, in the same order the ORM walks the book. `skip_guids` go into
+    a temporary table the query excludes, so skipped transactions never
+    leave the database.
+    """
+    accounts_table = Account.__table__
+    commodities_table = Commodity.__table__
+    transactions_table = Transaction.__table__
+    splits_table = Split.__table__
+
+    with book.session.bind.connect() as conn:
+        accounts = {}
+        account_rows = conn.execute(
+            select(accounts_table.c.guid, accounts_table.c.name, accounts_table.c.account_type,
+                   accounts_table.c.parent_guid, commodities_table.c.mnemonic)
+            .select_from(accounts_table.outerjoin(
+                commodities_table, accounts_table.c.commodity_guid == commodities_table.c.guid))
+        )
+        for guid, name, acct_type, parent_guid, mnemonic in account_rows:
+            accounts[guid] = (name, acct_type, parent_guid, mnemonic or "")
+
+        fullnames = {}
+        def fullname(guid):
+            # Same as piecash Account.fullname: the root account has an empty name
+            if guid not in fullnames:
+                name, _, parent_guid, _ = accounts[guid]
+                if parent_guid is None or parent_guid not in accounts:
+                    fullnames[guid] = ""
+                else:
+                    parent_fullname = fullname(parent_guid)
+                    fullnames[guid] = f"{parent_fullname}:{name}" if parent_fullname else name
+            return fullnames[guid]
+
+        split_query = (
+            select(transactions_table.c.guid, transactions_table.c.description, transactions_table.c.post_date,
+                   splits_table.c.account_guid, splits_table.c.value_num, splits_table.c.value_denom)
+            .select_from(transactions_table.join(splits_table, splits_table.c.tx_guid == transactions_table.c.guid))
+        )
+        if skip_guids:
+            skip_table = _skip_guids_table(conn, skip_guids)
+            split_query = split_query.where(transactions_table.c.guid.notin_(select(skip_table.c.guid)))
+        if conn.dialect.name == "sqlite":
+            split_query = split_query.order_by(literal_column("transactions.rowid"), literal_column("splits.rowid"))
+        rows = conn.execution_options(stream_results=True).execute(split_query)
+        for txn_guid, desc, txn_date, account_guid, value_num, value_denom in rows:
+            _, acct_type, _, mnemonic = accounts[account_guid]
+            yield (txn_guid, fullname(account_guid), acct_type, mnemonic if acct_type == "MUTUAL" else None,
+                   desc or '', txn_date, float(Decimal(value_num) / value_denom))
+
+def new_rules_state():
+    """Returns an empty rule-generation state.
+
+    The state holds everything the YAML is built from: per-account keyword
+    counts, account kind, AMFI code and latest credit, plus the
+    transactions already folded in, as {guid: transaction_signatures
+    digest}, and the accounts_signature of the book's accounts. It is saved
+    next to the YAML so later runs only need to process new transactions.
+    """
+    return {'version': RULES_STATE_VERSION, 'transactions': {}, 'accounts_signature': None, 'accounts': {}}
+
+def update_rules_state(state, records, workers=None):
+    """Folds split records from iter_splits_sql/iter_splits_orm into `state`.
+
+    Records are taken RECORD_BATCH_SIZE at a time; the descriptions of a
+    batch not seen before go through extract_keywords_many together.
+    """
+    records = iter(records)
+    keyword_cache = {}
+    while True:
+        batch = list(islice(records, RECORD_BATCH_SIZE))
+        if not batch:
+            return state
+        keyword_cache.update(extract_keywords_many(
+            (record[4] for record in batch if record[4] not in keyword_cache), workers))
+        _fold_records(state, batch, keyword_cache)
+
+def _fold_records(state, records, keyword_cache):
+    accounts = state['accounts']
+    transactions = state['transactions']
+    for txn_guid, acct_name, acct_type, mnemonic, desc, txn_date, amount in records:
+        # The signature is filled in by the caller, from transaction_signatures
+        transactions.setdefault(txn_guid, None)
+        acct = accounts.get(acct_name)
+        if acct is None:
+            acct = accounts[acct_name] = {
+                'asset': False, 'mutual': False, 'amfi_code': '', 'descriptions': 0, 'keywords': {},
+                'latest_credit': None,
+            }
+        # Keyword counts are document frequencies: descriptions using the keyword
+        acct['descriptions'] += 1
+        keywords = acct['keywords']
+        for keyword in keyword_cache[desc]:
+            keywords[keyword] = keywords.get(keyword, 0) + 1
+        # Use account.type for classification
+        if acct_type == "MUTUAL":
+            acct['mutual'] = True
+            acct['amfi_code'] = mnemonic
+        if acct_type == "ASSET":
+            acct['asset'] = True
+        # Keep the latest credit (positive) amount; the first one wins on equal dates
+        if amount > 0:
+            txn_day = txn_date.isoformat()
+            if acct['latest_credit'] is None or txn_day > acct['latest_credit'][0]:
+                acct['latest_credit'] = [txn_day, amount]
+
+def select_keywords(accounts, per_account=DEFAULT_KEYWORDS_PER_ACCOUNT, max_patterns=DEFAULT_MAX_PATTERNS,
+                    weighted=True):
+    """Picks the pattern keywords for every account.
+
+    Each keyword is scored per account TF-IDF style: the share of the
+    account's descriptions using it, times log(accounts / accounts using
+    it). A keyword goes only to the account where it scores highest, and
+    only if that account uses it in MIN_KEYWORD_SUPPORT descriptions, at
+    most MAX_KEYWORD_ACCOUNT_SHARE of the accounts use it and its score is
+    KEYWORD_DOMINANCE times the runner-up's, so patterns discriminate
+    between accounts. Each account keeps at most `per_account` keywords and
+    the whole file at most `max_patterns`, lowest scores trimmed first but
+    every account keeping its best one.
+
+    With weighted=False every keyword counts the same and each account keeps
+    its first `per_account` keywords alphabetically, as before weighting.
+    Returns {account: sorted keywords}.
+    """
+    if not weighted:
+        return {acct_name: sorted(acct['keywords'])[:per_account] for acct_name, acct in accounts.items()}
+
+    n_accounts = sum(1 for acct in accounts.values() if acct['keywords'])
+    accounts_using = {}
+    for acct in accounts.values():
+        for keyword in acct['keywords']:
+            accounts_using[keyword] = accounts_using.get(keyword, 0) + 1
+
+    max_accounts_using = max(1, int(n_accounts * MAX_KEYWORD_ACCOUNT_SHARE))
+    # keyword -> [score, account, count] of the account it discriminates
+    # best, and the runner-up's score
+    best = {}
+    runner_up = {}
+    for acct_name, acct in accounts.items():
+        for keyword, count in acct['keywords'].items():
+            if accounts_using[keyword] > max_accounts_using:
+                continue
+            score = count / acct['descriptions'] * math.log(n_accounts / accounts_using[keyword])
+            current = best.get(keyword)
+            if current is None or score > current[0]:
+                if current is not None:
+                    runner_up[keyword] = current[0]
+                best[keyword] = (score, acct_name, count)
+            elif score > runner_up.get(keyword, 0.0):
+                runner_up[keyword] = score
+
+    scored = {acct_name: [] for acct_name in accounts}
+    for keyword, (score, acct_name, count) in best.items():
+        if count >= MIN_KEYWORD_SUPPORT and score > 0 and score >= KEYWORD_DOMINANCE * runner_up.get(keyword, 0.0):
+            scored[acct_name].append((score, keyword))
+    kept = []
+    extra = []
+    for acct_name, candidates in scored.items():
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+        candidates = candidates[:per_account]
+        kept += [(acct_name, keyword) for _, keyword in candidates[:1]]
+        extra += [(score, acct_name, keyword) for score, keyword in candidates[1:]]
+    extra.sort(key=lambda c: (-c[0], c[1], c[2]))
+    kept += [(acct_name, keyword) for _, acct_name, keyword in extra[:max(0, max_patterns - len(kept))]]
+
+    selected = {acct_name: [] for acct_name in accounts}
+    for acct_name, keyword in kept:
+        selected[acct_name].append(keyword)
+    return {acct_name: sorted(keywords) for acct_name, keywords in selected.items()}
+
+def build_rules(state, per_account=DEFAULT_KEYWORDS_PER_ACCOUNT, max_patterns=DEFAULT_MAX_PATTERNS, weighted=True):
+    """Builds the rules YAML data from a rule-generation state."""
     rules = []
-    for acct_name, desc_list in account_desc_map.items():
-        # All unique keywords as patterns
-        all_keywords = set()
-        for d in desc_list:
-            all_keywords.update(clean_and_extract_keywords(d))
-        freq = Counter(all_keywords)
-        top_keywords = [k for k, c in freq.most_common(100)]
+    keywords = select_keywords(state['accounts'], per_account, max_patterns, weighted)
+    for acct_name, acct in state['accounts'].items():
         rule = {
             'account': acct_name,
-            'patterns': sorted(top_keywords)
+            'patterns': keywords[acct_name]
         }
         # Add value_conditions for ASSET accounts, using only credit (positive) transactions
-        if acct_name in asset_accounts:
-            amounts_dates = account_amount_date_map[acct_name]
-            # Filter only credit (positive) transactions
-            credit_txns = [(dt, amt) for dt, amt in amounts_dates if amt > 0]
-            if credit_txns:
-                latest_credit = max(credit_txns, key=lambda x: x[0])
-                latest_amount_int = int(round(abs(latest_credit[1])))
-                rule['value_conditions'] = [{'amount': latest_amount_int}]
+        if acct['asset'] and acct['latest_credit'] is not None:
+            latest_amount_int = int(round(abs(acct['latest_credit'][1])))
+            rule['value_conditions'] = [{'amount': latest_amount_int}]
         # Add mutual_fund section only for MUTUAL type accounts
-        if acct_name in mf_accounts:
-            amfi_code = mf_amfi_map.get(acct_name, '')
-            fund_house = mf_fund_house_map.get(acct_name)
+        if acct['mutual']:
+            fund_house = extract_fund_house(acct_name, MUTUAL_FUNDS_CONFIG)
             rule['mutual_fund'] = {
                 'fund_house': fund_house if fund_house else "UNKNOWN",
-                'amfi_scheme_code': amfi_code,
+                'amfi_scheme_code': acct['amfi_code'],
                 'price_determine': True
             }
         rules.append(rule)
@@ -108,18 +324,201 @@ def generate_account_rules(gnucash_file_path, output_yaml_path):
         for house, info in MUTUAL_FUNDS_CONFIG.items()
     }
 
-    yaml_data = {
+    return {
         'mutual_funds': mutual_funds,
         'rules': rules
     }
+
+def state_file_for(output_yaml_path):
+    return output_yaml_path + ".state.json"
+
+def load_rules_state(state_path):
+    """Returns the saved state, or None if missing or from another version."""
+    if not os.path.isfile(state_path):
+        return None
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+    if state.get('version') != RULES_STATE_VERSION:
+        return None
+    return state
+
+def save_rules_state(state, state_path):
+    # Write then rename so an interrupted run never leaves a truncated state
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def accounts_signature(book):
+    """Returns a digest of every account's name, parent, type and commodity.
+
+    Folded records carry account full names, types and AMFI codes, so
+    renaming, moving or retyping an account, or changing its commodity,
+    changes the digest.
+    """
+    accounts_table = Account.__table__
+    commodities_table = Commodity.__table__
+    query = (
+        select(accounts_table.c.guid, accounts_table.c.name, accounts_table.c.parent_guid,
+               accounts_table.c.account_type, commodities_table.c.mnemonic)
+        .select_from(accounts_table.outerjoin(
+            commodities_table, accounts_table.c.commodity_guid == commodities_table.c.guid))
+    )
+    with book.session.bind.connect() as conn:
+        rows = sorted('|'.join(str(field) for field in row) for row in conn.execute(query))
+    return hashlib.sha1('\n'.join(rows).encode()).hexdigest()
+
+def transaction_signatures(book):
+    """Returns {guid: digest} of every transaction in the book.
+
+    The digest covers what rule generation reads from a transaction (its
+    description, post date and the account and value of each split), so an
+    edited transaction gets a new one. Only the columns hashed are fetched,
+    without building account names or ORM objects.
+    """
+    transactions_table = Transaction.__table__
+    splits_table = Split.__table__
+    query = (
+        select(transactions_table.c.guid, transactions_table.c.description, transactions_table.c.post_date,
+               splits_table.c.account_guid, splits_table.c.value_num, splits_table.c.value_denom)
+        .select_from(transactions_table.outerjoin(splits_table, splits_table.c.tx_guid == transactions_table.c.guid))
+    )
+    fields = {}
+    with book.session.bind.connect() as conn:
+        for txn_guid, desc, txn_date, account_guid, value_num, value_denom in \
+                conn.execution_options(stream_results=True).execute(query):
+            txn = fields.get(txn_guid)
+            if txn is None:
+                txn = fields[txn_guid] = [f"{desc or ''}|{txn_date}"]
+            if account_guid is not None:
+                txn.append(f"{account_guid}|{value_num}/{value_denom}")
+    return {guid: hashlib.sha1('\n'.join([txn[0]] + sorted(txn[1:])).encode()).hexdigest()
+            for guid, txn in fields.items()}
+
+def evaluate_holdout(records, fraction, per_account=DEFAULT_KEYWORDS_PER_ACCOUNT, max_patterns=DEFAULT_MAX_PATTERNS):
+    """Reports how well generated rules classify transactions they weren't built from.
+
+    Rules are built from the earliest (1 - fraction) of the transactions by
+    post date, then matched against the rest. The account with the most
+    splits is taken as the statement account; each held-out transaction with
+    exactly two splits, one in it, is a test case whose answer is the other
+    account. Prints match rate and accuracy for the unweighted and weighted
+    keyword selections.
+    """
+    from rule_matcher import RuleMatcher
+
+    transactions = {}
+    split_counts = {}
+    for record in records:
+        transactions.setdefault(record[0], []).append(record)
+        split_counts[record[1]] = split_counts.get(record[1], 0) + 1
+    if not transactions:
+        print("Holdout: the book has no transactions.")
+        return
+    statement_account = max(split_counts, key=split_counts.get)
+    ordered = sorted(transactions.values(), key=lambda splits: splits[0][5])
+    n_train = len(ordered) - int(len(ordered) * fraction)
+    train_state = update_rules_state(new_rules_state(), (r for splits in ordered[:n_train] for r in splits))
+
+    cases = []
+    for splits in ordered[n_train:]:
+        accounts = [r[1] for r in splits]
+        if len(splits) == 2 and statement_account in accounts:
+            other = splits[1] if accounts[0] == statement_account else splits[0]
+            cases.append((other[4], abs(other[6]), other[1]))
+    if not cases:
+        print("Holdout: no held-out transactions against the statement account.")
+        return
+
+    print(f"Holdout: trained on {n_train} transactions, testing {len(cases)} against '{statement_account}'")
+    for label, weighted, budget in (("unweighted", False, 100), ("weighted", True, per_account)):
+        rules = build_rules(train_state, budget, max_patterns, weighted)['rules']
+        matcher = RuleMatcher(rules)
+        matched = correct = 0
+        for desc, value, expected in cases:
+            rule = matcher.match(desc, value)
+            if rule is not None:
+                matched += 1
+                correct += rule['account'] == expected
+        n_patterns = sum(len(rule['patterns']) for rule in rules)
+        print(f"  {label}: {n_patterns} patterns, match rate {matched / len(cases):.1%}, "
+              f"accuracy {correct / len(cases):.1%}")
+
+def generate_account_rules(gnucash_file_path, output_yaml_path, extract="sql", incremental=False, verify=False,
+                           per_account=DEFAULT_KEYWORDS_PER_ACCOUNT, max_patterns=DEFAULT_MAX_PATTERNS,
+                           holdout=None, workers=None):
+    book = piecash.open_book(gnucash_file_path, open_if_lock=True)
+    iter_splits = iter_splits_sql if extract == "sql" else iter_splits_orm
+    state_path = state_file_for(output_yaml_path)
+
+    state = load_rules_state(state_path) if incremental else None
+    signatures = transaction_signatures(book)
+    book_accounts = accounts_signature(book)
+    if state is not None and state['accounts_signature'] != book_accounts:
+        print("Accounts changed in the book since the last run; rebuilding all rules.")
+        state = None
+    if state is not None and any(signatures.get(guid) != signature
+                                 for guid, signature in state['transactions'].items()):
+        # Transactions were edited or deleted since the last run; counts can't be undone
+        print("Transactions edited or removed in the book since the last run; rebuilding all rules.")
+        state = None
+    if state is None:
+        state = update_rules_state(new_rules_state(), iter_splits(book), workers)
+    else:
+        known = len(state['transactions'])
+        update_rules_state(state, iter_splits(book, skip_guids=frozenset(state['transactions'])), workers)
+        print(f"Incremental update: {len(state['transactions']) - known} new transactions.")
+    # Transactions added during the run have no signature, so the next run rebuilds
+    state['transactions'] = {guid: signatures.get(guid) for guid in state['transactions']}
+    state['accounts_signature'] = book_accounts
+    yaml_data = build_rules(state, per_account, max_patterns)
+
+    if verify:
+        full_state = update_rules_state(new_rules_state(), iter_splits(book), workers)
+        full_data = build_rules(full_state, per_account, max_patterns)
+        if yaml.dump(full_data, sort_keys=False) == yaml.dump(yaml_data, sort_keys=False):
+            print("Verify: output matches a full rebuild.")
+        else:
+            print("Verify: output DIFFERS from a full rebuild; writing the full rebuild instead.")
+            full_state['transactions'] = {guid: signatures.get(guid) for guid in full_state['transactions']}
+            full_state['accounts_signature'] = book_accounts
+            state = full_state
+            yaml_data = full_data
+    if holdout:
+        evaluate_holdout(iter_splits(book), holdout, per_account, max_patterns)
+    book.close()
+
     with open(output_yaml_path, 'w') as f:
         yaml.dump(yaml_data, f, sort_keys=False)
+    save_rules_state(state, state_path)
     print(f"account_rules.yaml generated at {output_yaml_path}")
 
-if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 3:
-        print("Usage: python generate_account_rules.py <input.gnucash> <output.yaml>")
-    else:
-        generate_account_rules(sys.argv[1], sys.argv[2])
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate account_rules.yaml from a GnuCash book.")
+    parser.add_argument('gnucash_file', help="GnuCash SQLite book")
+    parser.add_argument('output_yaml', help="rules YAML to write")
+    parser.add_argument('--extract', choices=['sql', 'orm'], default='sql',
+                        help="read the book with bulk SQL queries (default) or through the piecash ORM")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only process transactions added since the last run (state in <output>.state.json); "
+                             "edited or removed transactions and changed accounts trigger a full rebuild")
+    parser.add_argument('--verify', action='store_true',
+                        help="also do a full rebuild and check the output matches it")
+    parser.add_argument('--keywords-per-account', type=int, default=DEFAULT_KEYWORDS_PER_ACCOUNT,
+                        help="most keyword patterns kept per account (default: %(default)s)")
+    parser.add_argument('--max-patterns', type=int, default=DEFAULT_MAX_PATTERNS,
+                        help="most keyword patterns in the whole rules file (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes for keyword extraction on large books (default: number of CPUs)")
+    parser.add_argument('--holdout', type=float, metavar='FRACTION', default=None,
+                        help="also report match rate on the latest FRACTION of transactions, "
+                             "using rules built from the rest")
+    args = parser.parse_args()
+    generate_account_rules(args.gnucash_file, args.output_yaml, extract=args.extract,
+                           incremental=args.incremental, verify=args.verify,
+                           per_account=args.keywords_per_account, max_patterns=args.max_patterns,
+                           holdout=args.holdout, workers=args.workers)
 
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,34 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
-import requests
 from io import StringIO
+from urllib.parse import urlparse
+import os
+import threading
+from nav_calendar import DEFAULT_FIXED_HOLIDAYS, DEFAULT_YEAR_HOLIDAYS, get_nav_calendar
+from nav_index import NavIndex
+from nav_store import get_nav_store
+from profiling import count, stage
 
-# Year-agnostic fixed-date holidays as (month, day) tuples
-FIXED_HOLIDAYS = [
-    (1, 26),   # Republic Day
-    (8, 15),   # Independence Day
-    (10, 2),   # Gandhi Jayanti
-    # Add other fixed-date holidays here
-]
-
-# Year-specific holidays dictionary: year -> set of holiday dates
-YEAR_SPECIFIC_HOLIDAYS = {
-    2024: {
-        datetime(2024, 3, 25).date(),   # Example variable holiday for 2024
-        datetime(2024, 11, 1).date(),   # Another example for 2024
-    },
-    2025: {
-        datetime(2025, 4, 10).date(),
-        datetime(2025, 4, 14).date(),
-        datetime(2025, 4, 18).date(),   
-        datetime(2025, 5, 1).date(),
-        datetime(2025, 8, 15).date(),
-        datetime(2025, 8, 27).date(),
-        datetime(2025, 10, 2).date(),
-        datetime(2025, 10, 21).date(),
-        datetime(2025, 10, 22).date(),
-        datetime(2025, 11, 5).date(),
-        datetime(2025, 12, 25).date(),
-    }
-    # Add more years as needed
-}
+# AMFI NAV history endpoint; override with AMFI_NAV_HISTORY_URL to use a local stand-in
+AMFI_NAV_HISTORY_URL = os.environ.get('AMFI_NAV_HISTORY_URL', "https://portal.amfiindia.com/DownloadNAVHistoryReport_Po.aspx")
+
+# HTTP settings for NAV downloads
+NAV_REQUEST_TIMEOUT = (10, 120)  # (connect, read) seconds
+NAV_MAX_RETRIES = 4
+NAV_BACKOFF_FACTOR = 0.5  # waits 0.5s, 1s, 2s, ... between retries
+NAV_MAX_CONNECTIONS_PER_HOST = 4
+NAV_FETCH_WORKERS = 8
+NAV_STREAM_CHUNK_SIZE = 64 * 1024
+NAV_PARSE_BATCH_LINES = 20000
+
+# Holiday lists now live in nav_calendar; kept under their old names for
+# is_holiday and get_next_business_day callers
+FIXED_HOLIDAYS = DEFAULT_FIXED_HOLIDAYS
+YEAR_SPECIFIC_HOLIDAYS = DEFAULT_YEAR_HOLIDAYS
 
 def is_holiday(date, fixed_holidays=None, year_specific_holidays=None):
     if fixed_holidays is None:
@@ -56,77 +53,386 @@ def get_next_business_day(date, fixed_holidays=None, year_specific_holidays=None
         next_date += timedelta(days=1)
     return next_date
 
-def parse_amfi_nav_data(data):
-    lines = data.splitlines()
-    # Find the header line
-    header_line = None
-    for i, line in enumerate(lines):
-        if line.startswith('Scheme Code;'):
-            header_line = i
-            break
-    if header_line is None:
-        raise ValueError("Header line not found in AMFI NAV data")
-    # Extract lines from header onwards
-    valid_lines = lines[header_line:]
-    # Filter out blank and malformed lines
-    filtered_lines = []
-    for line in valid_lines:
-        if line.strip() == '':
+def _parse_nav_batch(batch, columns):
+    """Parses a batch of 8-field NAV lines into a typed frame."""
+    if batch:
+        df = pd.read_csv(StringIO('\n'.join(batch)), sep=';', header=None, names=columns,
+                         dtype=str, keep_default_na=False, na_values=[''])
+    else:
+        df = pd.DataFrame({column: pd.Series(dtype=str) for column in columns})
+    codes = pd.to_numeric(df[columns[0]], errors='coerce')
+    # Lines whose scheme code is not a number are not NAV rows
+    df = df[codes.notna()]
+    df[columns[0]] = codes[codes.notna()].astype(np.int64)
+    for column in columns[4:7]:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float64)
+    df[columns[7]] = pd.to_datetime(df[columns[7]], format='%d-%b-%Y', errors='coerce')
+    return df
+
+
+def parse_amfi_nav_lines(lines, encoding='utf-8'):
+    """Parses AMFI NAV history lines (str or bytes) as they arrive.
+
+    Everything before the 'Scheme Code;' header, fund section headers, blank
+    and malformed lines are skipped on the fly. Valid lines are parsed in
+    batches of NAV_PARSE_BATCH_LINES into typed columns (int scheme code,
+    float NAV and prices, datetime64 date), so the payload is never held in
+    memory as a whole. Returns a DataFrame with the header's columns.
+    """
+    header = None
+    columns = None
+    batch = []
+    frames = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode(encoding)
+        line = line.rstrip('\r\n')
+        if header is None:
+            if line.startswith('Scheme Code;'):
+                header = line
+                columns = line.split(';')
+            continue
+        if line.count(';') != 7 or line == header:
             continue
-        parts = line.split(';')
-        if len(parts) == 8:
-            filtered_lines.append(line)
-    if not filtered_lines:
+        batch.append(line)
+        if len(batch) >= NAV_PARSE_BATCH_LINES:
+            frames.append(_parse_nav_batch(batch, columns))
+            batch = []
+
+    if header is None:
+        raise ValueError("Header line not found in AMFI NAV data")
+    if len(columns) != 8:
         raise ValueError("No valid NAV data lines found")
-    # Read into DataFrame
-    filtered_data = '\n'.join(filtered_lines)
-    df = pd.read_csv(StringIO(filtered_data), sep=';')
-    return df
+    if batch or not frames:
+        frames.append(_parse_nav_batch(batch, columns))
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    return pd.concat(frames, ignore_index=True)
+
+
+def parse_amfi_nav_data(data):
+    return parse_amfi_nav_lines(StringIO(data))
+
+
+_http_session = None
+_http_lock = threading.Lock()
+_host_semaphores = {}
+
+
+def get_http_session():
+    """Returns the shared keep-alive Session used for all NAV downloads."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            # requests is only imported once something is actually downloaded
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=NAV_MAX_RETRIES,
+                backoff_factor=NAV_BACKOFF_FACTOR,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET']),
+            )
+            adapter = HTTPAdapter(pool_maxsize=NAV_MAX_CONNECTIONS_PER_HOST, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+    return _http_session
+
+
+@contextmanager
+def http_stream(url):
+    """Streams a GET of `url` through the shared session.
+
+    At most NAV_MAX_CONNECTIONS_PER_HOST downloads per host run at a time;
+    the slot is held until the body has been read.
+    """
+    host = urlparse(url).netloc
+    with _http_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(NAV_MAX_CONNECTIONS_PER_HOST)
+        semaphore = _host_semaphores[host]
+    with semaphore:
+        response = get_http_session().get(url, timeout=NAV_REQUEST_TIMEOUT, stream=True)
+        try:
+            response.raise_for_status()
+            yield response
+        finally:
+            response.close()
+
+
+def fetch_nav_lines(url, parse=None):
+    """Downloads a NAV history URL and parses it line by line while streaming."""
+    if parse is None:
+        parse = parse_amfi_nav_lines
+    with http_stream(url) as response:
+        lines = response.iter_lines(chunk_size=NAV_STREAM_CHUNK_SIZE)
+        return parse(lines, response.encoding or 'utf-8')
+
+
+def fetch_nav_ranges(ranges, fetch=None, max_workers=NAV_FETCH_WORKERS):
+    """Fetches (mf_number, from_date, to_date) ranges in parallel with `fetch`.
+
+    `fetch` defaults to fetch_nav_data. Ranges with no NAV data are reported
+    and cached as empty (see cache_missing_nav_range), so lookups inside
+    them get no NAV instead of downloading again; any other error is raised.
+    """
+    if fetch is None:
+        fetch = fetch_nav_data
+
+    def fetch_range(nav_range):
+        mf_number, from_date, to_date = nav_range
+        try:
+            fetch(mf_number, from_date, to_date)
+        except ValueError as e:
+            cache_missing_nav_range(mf_number, from_date, to_date, e)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for _ in executor.map(fetch_range, ranges):
+            pass
+
+
+def cache_missing_nav_range(mf_number, from_date, to_date, error):
+    """Reports a range AMFI has no NAV data for and caches it as empty, so
+    every lookup inside it returns None without another request."""
+    print(f"Warning: no NAV data for mf={mf_number} {from_date} - {to_date}, "
+          f"its lookups get no NAV: {error}")
+    cache_key = (mf_number, from_date, to_date)
+    if cache_key in nav_cache:
+        return
+    nav_cache[cache_key] = pd.DataFrame(columns=['Scheme Code', 'Scheme Name', 'Net Asset Value', 'Date'])
+    nav_cache_ranges[mf_number].append((
+        datetime.strptime(from_date, '%d-%b-%Y').date(),
+        datetime.strptime(to_date, '%d-%b-%Y').date(),
+        cache_key,
+    ))
+
 
 # In-memory NAV cache: {(mf_number, from_date, to_date): DataFrame}
 nav_cache = {}
+# Lookup indexes built from nav_cache frames: {cache_key: NavIndex}
+nav_indexes = {}
+# Date ranges held in nav_cache: {mf_number: [(from_date, to_date, cache_key)]}
+nav_cache_ranges = defaultdict(list)
+
+# NAV history downloads made by this process; ranges answered by the store don't count
+nav_downloads = 0
+_nav_downloads_lock = threading.Lock()
+
+# Longest from/to span (in days) requested from the NAV history endpoint at once.
+# Kept conservative so a single request stays well within what AMFI serves.
+MAX_NAV_RANGE_DAYS = 90
+
+# Window convert.py downloads around each MF purchase date, kept for --compat v1
+LEGACY_NAV_WINDOW_DAYS = 7
 
 def fetch_nav_data(mf_number, from_date, to_date):
     cache_key = (mf_number, from_date, to_date)
     if cache_key in nav_cache:
+        count('nav memory cache hits')
         return nav_cache[cache_key]
-    url = f"https://portal.amfiindia.com/DownloadNAVHistoryReport_Po.aspx?mf={mf_number}&tp=1&frmdt={from_date}&todt={to_date}"
-    response = requests.get(url)
-    response.raise_for_status()
-    nav_df = parse_amfi_nav_data(response.text)
-    # Clean up date column
-    nav_df['Date'] = pd.to_datetime(nav_df['Date'], format='%d-%b-%Y', errors='coerce')
+    # Fall back to the on-disk store shared across runs
+    store = get_nav_store()
+    with stage('nav.store_load'):
+        nav_df = store.load(mf_number, from_date, to_date) if store is not None else None
+    if nav_df is None:
+        global nav_downloads
+        with _nav_downloads_lock:
+            nav_downloads += 1
+        count('nav downloads')
+        url = f"{AMFI_NAV_HISTORY_URL}?mf={mf_number}&tp=1&frmdt={from_date}&todt={to_date}"
+        with stage('nav.download'):
+            nav_df = fetch_nav_lines(url)
+        if store is not None:
+            with stage('nav.store_save'):
+                store.save(mf_number, from_date, to_date, nav_df)
+        print("fetched MF data for ", cache_key)
+    else:
+        count('nav store hits')
     nav_cache[cache_key] = nav_df
-    print("fetched MF data for ", cache_key)
+    nav_cache_ranges[mf_number].append((
+        datetime.strptime(from_date, '%d-%b-%Y').date(),
+        datetime.strptime(to_date, '%d-%b-%Y').date(),
+        cache_key,
+    ))
     return nav_df
 
 
+def find_cached_nav_key(mf_number, date):
+    """Returns the nav_cache key of a cached range covering `date`, or None."""
+    for from_date, to_date, cache_key in nav_cache_ranges.get(mf_number, ()):
+        if from_date <= date <= to_date:
+            return cache_key
+    return None
+
+
+def get_nav_index(cache_key):
+    """Returns the NavIndex for a nav_cache entry, building it on first use."""
+    index = nav_indexes.get(cache_key)
+    if index is None:
+        index = nav_indexes[cache_key] = NavIndex(nav_cache[cache_key])
+    return index
+
+
+def plan_nav_ranges(lookups, max_days=MAX_NAV_RANGE_DAYS):
+    """Merges (mf_number, date) lookups into the fewest (mf_number, from, to) ranges.
+
+    Each range spans at most `max_days` days.
+    """
+    dates_by_mf = defaultdict(set)
+    for mf_number, date in lookups:
+        dates_by_mf[mf_number].add(date)
+    ranges = []
+    for mf_number, dates in dates_by_mf.items():
+        dates = sorted(dates)
+        start = end = dates[0]
+        for date in dates[1:]:
+            if (date - start).days >= max_days:
+                ranges.append((mf_number, start, end))
+                start = date
+            end = date
+        ranges.append((mf_number, start, end))
+    return ranges
+
+
+def prefetch_navs(lookups, max_days=MAX_NAV_RANGE_DAYS, max_workers=NAV_FETCH_WORKERS):
+    """Fetches NAV history for all (mf_number, nav date) lookups up front.
+
+    Lookups not already cached are coalesced into ranges by plan_nav_ranges
+    and the ranges are fetched in parallel, once each; get_nav_for_date then
+    answers from the cached ranges. Returns (lookups to fetch, NAV downloads
+    made), the downloads leaving out ranges the NAV store already held.
+    """
+    pending = {(mf_number, date) for mf_number, date in lookups
+               if find_cached_nav_key(mf_number, date) is None}
+    if not pending:
+        return 0, 0
+    ranges = plan_nav_ranges(pending, max_days)
+    downloads_before = nav_downloads
+    fetch_nav_ranges(
+        [(mf_number, start.strftime('%d-%b-%Y'), end.strftime('%d-%b-%Y')) for mf_number, start, end in ranges],
+        max_workers=max_workers,
+    )
+    downloads = nav_downloads - downloads_before
+    print(f"NAV prefetch: {len(pending)} lookups in {len(ranges)} ranges, {downloads} downloads "
+          f"({len(pending) - downloads} requests saved)")
+    return len(pending), downloads
+
+
+def get_nav_date(date_str):
+    """Returns the date whose NAV applies to a 'dd/mm/yyyy' transaction date."""
+    date = datetime.strptime(date_str, '%d/%m/%Y').date()
+    # Move to next business day if weekend or holiday
+    return get_nav_calendar().next_business_day(date)
+
+
+def get_nav_dates(date_strs):
+    """get_nav_date for many dates; returns a list of dates.
+
+    Takes 'dd/mm/yyyy' strings or a datetime64 array, as statement_formats
+    reads them. Statements repeat dates, so each distinct string is parsed
+    once; all of them are rolled in one vectorized call.
+    """
+    if isinstance(date_strs, np.ndarray) and date_strs.dtype.kind == 'M':
+        return get_nav_calendar().roll_forward(date_strs).astype(object).tolist()
+    date_strs = list(date_strs)
+    unique = list(dict.fromkeys(date_strs))
+    rolled = get_nav_calendar().roll_forward([datetime.strptime(s, '%d/%m/%Y').date() for s in unique])
+    nav_dates = dict(zip(unique, rolled.astype(object).tolist()))
+    return [nav_dates[s] for s in date_strs]
+
+
+def _nav_cache_key_for(mf_number, date):
+    # Prefer a range already fetched by prefetch_navs
+    cache_key = find_cached_nav_key(mf_number, date)
+    if cache_key is None:
+        from_date = date.strftime('%d-%b-%Y')
+        try:
+            fetch_nav_data(mf_number, from_date, from_date)
+        except ValueError as e:
+            cache_missing_nav_range(mf_number, from_date, from_date, e)
+        cache_key = (mf_number, from_date, from_date)
+    return cache_key
+
+
+def get_imported_navs(lookups):
+    """Answers (mf_number, scheme_code, date) lookups from the bulk NAV files
+    imported into the store (nav_store.py import).
+
+    Returns {position: NAV or None} for the lookups whose scheme was
+    imported for their date; the others still need a download.
+    """
+    store = get_nav_store()
+    if store is None or not lookups:
+        return {}
+    with store.lock:
+        if store.conn.execute("SELECT 1 FROM imported_range LIMIT 1").fetchone() is None:
+            return {}
+    answers = {}
+    result = {}
+    for pos, (mf_number, scheme_code, date) in enumerate(lookups):
+        key = (mf_number, str(scheme_code), date)
+        if key not in answers:
+            answers[key] = store.imported_nav(*key)
+        covered, nav = answers[key]
+        if covered:
+            result[pos] = nav
+    count('nav imported hits', len(result))
+    return result
+
+
 def get_nav_for_date(mf_number, scheme_code, date_str):
     # date_str is expected in 'dd/mm/yyyy'
-    date = datetime.strptime(date_str, '%d/%m/%Y').date()
+    date = get_nav_date(date_str)
+    imported = get_imported_navs([(mf_number, scheme_code, date)])
+    if imported:
+        return imported[0]
+    return get_nav_index(_nav_cache_key_for(mf_number, date)).lookup(scheme_code, date)
 
-    # Extract year, get year-specific holidays for that year (empty set if none)
-    year_holidays = YEAR_SPECIFIC_HOLIDAYS.get(date.year, set())
 
-    # Move to next business day if weekend or holiday
-    date = get_next_business_day(date, FIXED_HOLIDAYS, year_holidays)
-
-    from_date = date.strftime('%d-%b-%Y')
-    nav_df = fetch_nav_data(mf_number, from_date, from_date)
-    nav_df['Scheme Code'] = nav_df['Scheme Code'].astype(str)
-    scheme_code = str(scheme_code)
-    filtered = nav_df[
-        (nav_df['Scheme Code'] == scheme_code) &
-        (nav_df['Date'] == pd.Timestamp(date))
-    ]
-    if filtered.empty:
-        filtered = nav_df[
-            (nav_df['Scheme Code'] == scheme_code) &
-            (nav_df['Date'] <= pd.Timestamp(date))
-        ].sort_values('Date', ascending=False).head(1)
-    if filtered.empty:
-        return None
-    try:
-        return float(filtered.iloc[0]['Net Asset Value'])
-    except Exception:
-        return None
+def nav_window(date, days=LEGACY_NAV_WINDOW_DAYS):
+    """Returns the (from, to) AMFI date strings of the +-days window around a date."""
+    return (date - timedelta(days=days)).strftime('%d-%b-%Y'), (date + timedelta(days=days)).strftime('%d-%b-%Y')
+
+
+def get_navs_in_windows(lookups, days=LEGACY_NAV_WINDOW_DAYS, max_workers=NAV_FETCH_WORKERS):
+    """convert.py's original NAV lookup, for many (mf_number, scheme_code, date) at once.
+
+    Each date is answered from its own +-days download window with the
+    latest NAV on or before the date itself; there is no business-day
+    rolling. Distinct windows are fetched once, in parallel, except for
+    the lookups get_imported_navs answers. Returns a list of NAVs, None
+    where no NAV was found.
+    """
+    imported = get_imported_navs(lookups)
+    keys = [(mf_number, *nav_window(date, days)) for mf_number, _, date in lookups]
+    fetch_nav_ranges(sorted({key for pos, key in enumerate(keys) if pos not in imported and key not in nav_cache}),
+                     max_workers=max_workers)
+    return [imported[pos] if pos in imported else
+            get_nav_index(key).lookup(scheme_code, date) if key in nav_cache else None
+            for pos, (key, (_, scheme_code, date)) in enumerate(zip(keys, lookups))]
+
+
+def get_navs_for_dates(lookups):
+    """Resolves many (mf_number, scheme_code, nav_date) lookups at once.
+
+    nav_date is the already rolled date from get_nav_date. Lookups are grouped
+    by cached range and answered with one vectorized NavIndex call per range.
+    Returns a list of NAVs, None where no NAV was found.
+    """
+    groups = defaultdict(list)
+    for pos, (mf_number, _, date) in enumerate(lookups):
+        groups[_nav_cache_key_for(mf_number, date)].append(pos)
+    results = [None] * len(lookups)
+    for cache_key, positions in groups.items():
+        navs = get_nav_index(cache_key).lookup_many(
+            [lookups[pos][1] for pos in positions],
+            [lookups[pos][2] for pos in positions],
+        )
+        for pos, nav in zip(positions, navs):
+            if not np.isnan(nav):
+                results[pos] = float(nav)
+    return results
@@ -0,0 +1,152 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import yaml
+
+# Built-in holidays, used when no holiday file is given.
+# Year-agnostic fixed-date holidays as (month, day) tuples
+DEFAULT_FIXED_HOLIDAYS = [
+    (1, 26),   # Republic Day
+    (8, 15),   # Independence Day
+    (10, 2),   # Gandhi Jayanti
+]
+
+# Year-specific holidays: year -> set of holiday dates
+DEFAULT_YEAR_HOLIDAYS = {
+    2024: {
+        date(2024, 3, 25),
+        date(2024, 11, 1),
+    },
+    2025: {
+        date(2025, 4, 10),
+        date(2025, 4, 14),
+        date(2025, 4, 18),
+        date(2025, 5, 1),
+        date(2025, 8, 15),
+        date(2025, 8, 27),
+        date(2025, 10, 2),
+        date(2025, 10, 21),
+        date(2025, 10, 22),
+        date(2025, 11, 5),
+        date(2025, 12, 25),
+    },
+}
+
+# numpy needs every holiday as a date, so fixed holidays are expanded over
+# these years
+FIXED_HOLIDAY_YEARS = range(1990, 2101)
+
+WEEKMASK = '1111100'  # Monday to Friday
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in ('%Y-%m-%d', '%d-%b-%Y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognized holiday date: {value!r}")
+
+
+def _parse_month_day(value):
+    if isinstance(value, (list, tuple)):
+        month, day = value
+    else:
+        month, day = str(value).strip().split('-')
+    return int(month), int(day)
+
+
+class BusinessCalendar:
+    """NAV business days: weekdays that are not market holidays.
+
+    Holidays are compiled once into a numpy busdaycalendar, so whole arrays
+    of transaction dates are rolled to their NAV date with one
+    numpy.busday_offset call.
+    """
+
+    def __init__(self, fixed_holidays=DEFAULT_FIXED_HOLIDAYS, year_holidays=DEFAULT_YEAR_HOLIDAYS):
+        self.fixed_holidays = sorted(set(fixed_holidays))
+        self.year_holidays = {year: set(days) for year, days in year_holidays.items()}
+        holidays = {day for days in self.year_holidays.values() for day in days}
+        for year in FIXED_HOLIDAY_YEARS:
+            for month, day in self.fixed_holidays:
+                try:
+                    holidays.add(date(year, month, day))
+                except ValueError:  # Feb 29 outside leap years
+                    pass
+        self.holidays = frozenset(holidays)
+        self.busdaycal = np.busdaycalendar(weekmask=WEEKMASK, holidays=sorted(holidays))
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads a holiday YAML on top of the built-in holidays.
+
+        The file has a `fixed` list of MM-DD holidays that replaces the
+        built-in one, and a `years` mapping of year -> holiday dates
+        (YYYY-MM-DD or dd-Mon-yyyy, as NSE publishes them). A year listed in
+        the file replaces that year's built-in holidays:
+
+            fixed: [01-26, 08-15, 10-02]
+            years:
+              2026: [2026-01-26, 2026-03-03, 26-Mar-2026]
+        """
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+        fixed = DEFAULT_FIXED_HOLIDAYS
+        if 'fixed' in config:
+            fixed = [_parse_month_day(value) for value in config['fixed'] or ()]
+        year_holidays = dict(DEFAULT_YEAR_HOLIDAYS)
+        for year, days in (config.get('years') or {}).items():
+            year_holidays[int(year)] = {_parse_date(day) for day in days or ()}
+        return cls(fixed, year_holidays)
+
+    def is_business_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+    def roll_forward(self, dates):
+        """Rolls an array of dates to the next business day (unchanged if already one).
+
+        Returns a datetime64[D] array.
+        """
+        return np.busday_offset(np.asarray(dates, dtype='datetime64[D]'), 0, roll='forward',
+                                busdaycal=self.busdaycal)
+
+    def next_business_day(self, day):
+        # Plain loop; cheaper than a numpy call for one date
+        while not self.is_business_day(day):
+            day += timedelta(days=1)
+        return day
+
+
+_nav_calendar = None
+_nav_calendar_lock = threading.Lock()
+
+
+def get_nav_calendar():
+    """Returns the shared BusinessCalendar.
+
+    Holidays come from the YAML named by GNUSPLITCASH_HOLIDAYS, if set,
+    otherwise from the built-in lists.
+    """
+    global _nav_calendar
+    with _nav_calendar_lock:
+        if _nav_calendar is None:
+            path = os.environ.get('GNUSPLITCASH_HOLIDAYS')
+            _nav_calendar = BusinessCalendar.from_file(path) if path else BusinessCalendar()
+    return _nav_calendar
+
+
+def use_holiday_file(path):
+    """Makes get_nav_calendar use the holidays in `path`, here and in child processes."""
+    global _nav_calendar
+    calendar = BusinessCalendar.from_file(path)
+    with _nav_calendar_lock:
+        _nav_calendar = calendar
+    os.environ['GNUSPLITCASH_HOLIDAYS'] = path
+    return calendar
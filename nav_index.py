@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+
+class NavIndex:
+    """Per-scheme NAV lookup table built once from a parsed AMFI NAV frame.
+
+    Each scheme code maps to a sorted datetime64[D] array of NAV dates and a
+    matching float array of NAVs, so "latest NAV on or before a date" is a
+    binary search instead of a DataFrame filter.
+    """
+
+    def __init__(self, nav_df):
+        codes = nav_df['Scheme Code'].astype(str).to_numpy(dtype=object)
+        dates = nav_df['Date'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+        navs = pd.to_numeric(nav_df['Net Asset Value'], errors='coerce').to_numpy(dtype=float)
+
+        valid = ~np.isnat(dates)
+        codes, dates, navs = codes[valid], dates[valid], navs[valid]
+        # lexsort is stable, so the first row wins among duplicate dates
+        order = np.lexsort((dates, codes))
+        codes, dates, navs = codes[order], dates[order], navs[order]
+
+        self.schemes = {}
+        boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(codes)]):
+            if start == end:
+                continue
+            scheme_dates = dates[start:end]
+            first = np.r_[True, scheme_dates[1:] != scheme_dates[:-1]]
+            self.schemes[codes[start]] = (scheme_dates[first], navs[start:end][first])
+
+    def lookup(self, scheme_code, date):
+        """Returns the latest NAV on or before `date`, or None."""
+        entry = self.schemes.get(str(scheme_code))
+        if entry is None:
+            return None
+        dates, navs = entry
+        i = np.searchsorted(dates, np.datetime64(date, 'D'), side='right') - 1
+        if i < 0 or np.isnan(navs[i]):
+            return None
+        return float(navs[i])
+
+    def lookup_many(self, scheme_codes, dates):
+        """Vectorized lookup; returns a float array with NaN where no NAV is found."""
+        codes = np.array([str(code) for code in scheme_codes], dtype=object)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        result = np.full(len(codes), np.nan)
+        for code in set(codes):
+            entry = self.schemes.get(code)
+            if entry is None:
+                continue
+            scheme_dates, navs = entry
+            rows = np.flatnonzero(codes == code)
+            idx = np.searchsorted(scheme_dates, dates[rows], side='right') - 1
+            found = idx >= 0
+            result[rows[found]] = navs[idx[found]]
+        return result
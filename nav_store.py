@@ -0,0 +1,402 @@
+import argparse
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime, date as date_cls, timedelta
+
+import pandas as pd
+
+# Default on-disk location of the NAV store; set GNUSPLITCASH_NAV_STORE to an
+# empty string to disable it.
+DEFAULT_NAV_STORE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'gnusplitcash', 'nav_store.sqlite3')
+
+AMFI_DATE_FORMAT = '%d-%b-%Y'
+
+# Columns read from bulk NAV files. NAVAll.txt snapshots have 6 fields and
+# NAV history reports 8, so fields are found by their header name.
+BULK_NAV_COLUMNS = ('Scheme Code', 'Scheme Name', 'Net Asset Value', 'Date')
+# Rows per executemany() when importing bulk files
+IMPORT_BATCH_ROWS = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nav (
+    mf_number INTEGER NOT NULL,
+    scheme_code TEXT NOT NULL,
+    date TEXT NOT NULL,
+    scheme_name TEXT,
+    nav REAL,
+    PRIMARY KEY (mf_number, scheme_code, date)
+);
+CREATE TABLE IF NOT EXISTS fetched_range (
+    mf_number INTEGER NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    PRIMARY KEY (mf_number, from_date, to_date)
+);
+CREATE TABLE IF NOT EXISTS imported_range (
+    mf_number INTEGER NOT NULL,
+    scheme_code TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    PRIMARY KEY (mf_number, scheme_code, from_date, to_date)
+);
+"""
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value, AMFI_DATE_FORMAT).date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+class NavStore:
+    """SQLite store of downloaded AMFI NAV history, shared across runs.
+
+    Rows are keyed on (mf_number, scheme_code, date). Each downloaded
+    (mf_number, from, to) range is recorded, so a later request that falls
+    inside already fetched ranges is answered without any network I/O.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # WAL plus a busy timeout lets concurrent runs read and write safely;
+        # within a run the connection is shared by the fetch threads
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def has_range(self, mf_number, from_date, to_date):
+        """Returns True if [from_date, to_date] is covered by fetched ranges."""
+        from_date, to_date = _to_date(from_date), _to_date(to_date)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT from_date, to_date FROM fetched_range"
+                " WHERE mf_number = ? AND to_date >= ? AND from_date <= ? ORDER BY from_date",
+                (mf_number, from_date.isoformat(), to_date.isoformat()),
+            ).fetchall()
+        covered_until = from_date - timedelta(days=1)
+        for start, end in rows:
+            if date_cls.fromisoformat(start) > covered_until + timedelta(days=1):
+                return False
+            covered_until = max(covered_until, date_cls.fromisoformat(end))
+            if covered_until >= to_date:
+                return True
+        return False
+
+    def load(self, mf_number, from_date, to_date):
+        """Returns the stored NAV frame for the range, or None if not fully fetched."""
+        if not self.has_range(mf_number, from_date, to_date):
+            return None
+        from_date, to_date = _to_date(from_date), _to_date(to_date)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT scheme_code, scheme_name, nav, date FROM nav"
+                " WHERE mf_number = ? AND date BETWEEN ? AND ? ORDER BY scheme_code, date",
+                (mf_number, from_date.isoformat(), to_date.isoformat()),
+            ).fetchall()
+        nav_df = pd.DataFrame(rows, columns=['Scheme Code', 'Scheme Name', 'Net Asset Value', 'Date'])
+        nav_df['Date'] = pd.to_datetime(nav_df['Date'], format='%Y-%m-%d')
+        return nav_df
+
+    def save(self, mf_number, from_date, to_date, nav_df):
+        """Stores a parsed NAV frame and records its range as fetched."""
+        from_date, to_date = _to_date(from_date), _to_date(to_date)
+        valid = nav_df[nav_df['Date'].notna()]
+        navs = pd.to_numeric(valid['Net Asset Value'], errors='coerce')
+        rows = [
+            (mf_number, str(code), day.date().isoformat(), name, None if pd.isna(nav) else float(nav))
+            for code, name, nav, day in zip(valid['Scheme Code'], valid['Scheme Name'], navs, valid['Date'])
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO nav VALUES (?, ?, ?, ?, ?)", rows)
+            # AMFI may still publish NAVs for today, so only past days count as complete
+            complete_until = min(to_date, date_cls.today() - timedelta(days=1))
+            if complete_until >= from_date:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO fetched_range VALUES (?, ?, ?)",
+                    (mf_number, from_date.isoformat(), complete_until.isoformat()),
+                )
+
+    def imported_ranges(self, mf_number, scheme_code):
+        """Returns the (from, to) date ranges bulk files were imported for, for one scheme."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT from_date, to_date FROM imported_range WHERE mf_number = ? AND scheme_code = ?",
+                (mf_number, str(scheme_code)),
+            ).fetchall()
+        return [(date_cls.fromisoformat(start), date_cls.fromisoformat(end)) for start, end in rows]
+
+    def imported_nav(self, mf_number, scheme_code, date):
+        """Looks a NAV up in the imported bulk files.
+
+        Returns (True, NAV) if `scheme_code` was imported for `date`, the
+        NAV being the latest on or before it within the imported range (None
+        if there is none), and (False, None) otherwise.
+        """
+        day = date.isoformat()
+        with self.lock:
+            covering = self.conn.execute(
+                "SELECT from_date FROM imported_range"
+                " WHERE mf_number = ? AND scheme_code = ? AND from_date <= ? AND to_date >= ? LIMIT 1",
+                (mf_number, str(scheme_code), day, day),
+            ).fetchone()
+            if covering is None:
+                return False, None
+            nav = self.conn.execute(
+                "SELECT nav FROM nav WHERE mf_number = ? AND scheme_code = ? AND date BETWEEN ? AND ?"
+                " ORDER BY date DESC LIMIT 1",
+                (mf_number, str(scheme_code), covering[0], day),
+            ).fetchone()
+        return True, nav[0] if nav else None
+
+    def import_rows(self, rows, ranges):
+        """Stores imported (mf_number, scheme_code, date, scheme_name, nav) rows.
+
+        `ranges` maps (mf_number, scheme_code) to the scheme's imported
+        (from, to) date ranges, which replace the ones stored before.
+        Imports never add to fetched_range: they only cover the schemes
+        they hold, so the other schemes of a fund house are still
+        downloaded.
+        """
+        with self.lock, self.conn:
+            for start in range(0, len(rows), IMPORT_BATCH_ROWS):
+                self.conn.executemany("INSERT OR REPLACE INTO nav VALUES (?, ?, ?, ?, ?)",
+                                      rows[start:start + IMPORT_BATCH_ROWS])
+            for (mf_number, scheme_code), scheme_ranges in ranges.items():
+                self.conn.execute("DELETE FROM imported_range WHERE mf_number = ? AND scheme_code = ?",
+                                  (mf_number, scheme_code))
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO imported_range VALUES (?, ?, ?, ?)",
+                    [(mf_number, scheme_code, start.isoformat(), end.isoformat()) for start, end in scheme_ranges],
+                )
+
+
+_nav_store = None
+_nav_store_lock = threading.Lock()
+
+
+def get_nav_store():
+    """Returns the shared NavStore, or None if the store is disabled."""
+    global _nav_store
+    with _nav_store_lock:
+        if _nav_store is None:
+            path = os.environ.get('GNUSPLITCASH_NAV_STORE', DEFAULT_NAV_STORE_PATH)
+            if not path:
+                return None
+            _nav_store = NavStore(path)
+    return _nav_store
+
+
+def month_ranges(from_date, to_date):
+    """Splits [from_date, to_date] into calendar-month (from, to) pairs."""
+    start = from_date
+    while start <= to_date:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        end = min(next_month - timedelta(days=1), to_date)
+        yield start, end
+        start = next_month
+
+
+def prefill(mf_numbers, from_date, to_date):
+    """Downloads NAV history month by month into the store, skipping stored months."""
+    from mf_nav_util import fetch_nav_ranges
+
+    store = get_nav_store()
+    if store is None:
+        print("NAV store is disabled (GNUSPLITCASH_NAV_STORE is empty).")
+        return
+    ranges = [
+        (mf_number, start.strftime(AMFI_DATE_FORMAT), end.strftime(AMFI_DATE_FORMAT))
+        for mf_number in mf_numbers
+        for start, end in month_ranges(from_date, to_date)
+        if not store.has_range(mf_number, start, end)
+    ]
+    fetch_nav_ranges(ranges)
+
+
+def referenced_schemes(rules, mutual_funds):
+    """Returns {amfi_scheme_code: {mf_number}} of the funds the rules price by NAV."""
+    schemes = {}
+    for rule in rules:
+        fund = rule.get('mutual_fund')
+        if not fund or 'amfi_scheme_code' not in fund or fund.get('fund_house') not in mutual_funds:
+            continue
+        mf_number = mutual_funds[fund['fund_house']]['mf_number']
+        schemes.setdefault(str(fund['amfi_scheme_code']), set()).add(mf_number)
+    return schemes
+
+
+def read_bulk_nav_file(path, scheme_codes):
+    """Reads the NAVs of `scheme_codes` from an AMFI bulk NAV file.
+
+    Takes NAVAll.txt snapshots and NAV history reports alike. The file is
+    memory-mapped and the lines of `scheme_codes` are found in one regular
+    expression scan, so the lines of other schemes are never decoded or
+    split. Returns ([(scheme_code, scheme_name, nav, date)], field count).
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"'{path}' is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = mm.find(b'Scheme Code;')
+            if start < 0:
+                raise ValueError(f"'{path}' is not an AMFI NAV file: no 'Scheme Code;' header line")
+            header_end = mm.find(b'\n', start)
+            if header_end < 0:
+                header_end = len(mm)
+            header = mm[start:header_end].decode('utf-8').strip().split(';')
+            lines = []
+            if scheme_codes:
+                pattern = re.compile(
+                    rb'\n(?:' + b'|'.join(re.escape(code.encode()) for code in scheme_codes) + rb');[^\n]*')
+                lines = pattern.findall(mm, header_end)
+    fields = len(header)
+    code_at, name_at, nav_at, date_at = (header.index(column) for column in BULK_NAV_COLUMNS)
+    dates = {}
+    rows = []
+    for line in lines:
+        values = line[1:].decode('utf-8', 'replace').rstrip('\r').split(';')
+        if len(values) != fields:
+            continue
+        date_str = values[date_at].strip()
+        day = dates.get(date_str)
+        if day is None:
+            try:
+                day = datetime.strptime(date_str, AMFI_DATE_FORMAT).date()
+            except ValueError:
+                day = False
+            dates[date_str] = day
+        if not day:
+            continue
+        try:
+            nav = float(values[nav_at])
+        except ValueError:  # 'N.A.'
+            nav = None
+        rows.append((values[code_at].strip(), values[name_at].strip(), nav, day))
+    return rows, fields
+
+
+def merge_ranges(ranges, calendar=None):
+    """Merges (from, to) date ranges that overlap or touch.
+
+    With a nav_calendar.BusinessCalendar, ranges separated only by
+    weekends and holidays are merged too, so daily NAVAll snapshots add up
+    to one continuous range.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged:
+            gap_start = merged[-1][1] + timedelta(days=1)
+            if start <= gap_start or (calendar is not None and calendar.next_business_day(gap_start) >= start):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                continue
+        merged.append((start, end))
+    return merged
+
+
+def import_bulk_files(paths, schemes, store=None):
+    """Imports the NAVs of `schemes` ({scheme_code: {mf_number}}) from bulk NAV files.
+
+    The dates each scheme has in a file are recorded as imported for that
+    scheme: the first-to-last date span of a history report, and the
+    scheme's date in a NAVAll snapshot. They are merged with the scheme's
+    earlier imports. Lookups of the scheme inside them are then answered
+    from the store without downloading (NavStore.imported_nav). Schemes
+    added to the rules later need another import. Returns (NAV rows,
+    {scheme_code: rows}, {(mf_number, scheme_code): merged (from, to)
+    ranges}).
+    """
+    from nav_calendar import get_nav_calendar
+
+    store = store or get_nav_store()
+    if store is None:
+        raise ValueError("NAV store is disabled (GNUSPLITCASH_NAV_STORE is empty)")
+    found = dict.fromkeys(schemes, 0)
+    nav_rows = []
+    scheme_ranges = defaultdict(list)
+    for path in paths:
+        rows, fields = read_bulk_nav_file(path, schemes)
+        scheme_dates = defaultdict(list)
+        for scheme_code, scheme_name, nav, day in rows:
+            found[scheme_code] += 1
+            scheme_dates[scheme_code].append(day)
+            for mf_number in schemes[scheme_code]:
+                nav_rows.append((mf_number, scheme_code, day.isoformat(), scheme_name, nav))
+        for scheme_code, days in scheme_dates.items():
+            # History reports have 8 fields, NAVAll snapshots 6
+            file_range = (min(days), max(days)) if fields == 8 else (max(days), max(days))
+            for mf_number in schemes[scheme_code]:
+                scheme_ranges[mf_number, scheme_code].append(file_range)
+    calendar = get_nav_calendar()
+    merged = {key: merge_ranges(ranges + store.imported_ranges(*key), calendar)
+              for key, ranges in sorted(scheme_ranges.items())}
+    store.import_rows(nav_rows, merged)
+    return len(nav_rows), found, merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local AMFI NAV store.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    prefill_parser = subparsers.add_parser('prefill', help="download NAV history into the store")
+    prefill_parser.add_argument('--rules', help="account rules YAML; prefill every fund house in mutual_funds")
+    prefill_parser.add_argument('--mf', type=int, action='append', default=[], help="AMFI mf number (repeatable)")
+    prefill_parser.add_argument('--from', dest='from_date', required=True, help="start date, dd-Mon-yyyy")
+    prefill_parser.add_argument('--to', dest='to_date', default=None, help="end date, dd-Mon-yyyy (default: yesterday)")
+    import_parser = subparsers.add_parser(
+        'import', help="load AMFI bulk NAV files (NAVAll.txt, NAV history reports) into the store, offline")
+    import_parser.add_argument('files', nargs='+', help="bulk NAV text files")
+    import_parser.add_argument('--rules', action='append', required=True,
+                               help="account rules YAML (repeatable); only their amfi_scheme_codes are imported")
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        from rules_cache import load_rules
+        schemes = {}
+        for rules_file in args.rules:
+            for scheme_code, mf_numbers in referenced_schemes(*load_rules(rules_file)).items():
+                schemes.setdefault(scheme_code, set()).update(mf_numbers)
+        if not schemes:
+            parser.error("the rules reference no amfi_scheme_code of a fund house in mutual_funds")
+        try:
+            imported, found, ranges = import_bulk_files(args.files, schemes)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"Imported {imported} NAVs of {sum(1 for rows in found.values() if rows)} schemes "
+              f"from {len(args.files)} files")
+        for (mf_number, scheme_code), scheme_ranges in ranges.items():
+            print(f"mf {mf_number} scheme {scheme_code}: " + ', '.join(
+                f"{start.strftime(AMFI_DATE_FORMAT)} to {end.strftime(AMFI_DATE_FORMAT)}"
+                for start, end in scheme_ranges))
+        missing = sorted(code for code, rows in found.items() if not rows)
+        if missing:
+            print(f"Warning: no NAVs found for scheme codes {', '.join(missing)}")
+        return
+
+    mf_numbers = list(args.mf)
+    if args.rules:
+        from rules_cache import load_rules
+        _, mutual_funds = load_rules(args.rules)
+        mf_numbers += [info['mf_number'] for info in mutual_funds.values()]
+    if not mf_numbers:
+        parser.error("no mf numbers given; use --mf or --rules")
+    from_date = _to_date(args.from_date)
+    to_date = _to_date(args.to_date) if args.to_date else date_cls.today() - timedelta(days=1)
+    prefill(sorted(set(mf_numbers)), from_date, to_date)
+
+
+if __name__ == "__main__":
+    main()
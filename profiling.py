@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Bump when the JSON report changes shape
+PROFILE_FORMAT_VERSION = 1
+
+
+class Profiler:
+    """Wall time and call counts per pipeline stage.
+
+    Stages are dotted names ('convert.match', 'nav.download', ...) timed
+    with stage(); counters are plain event counts. Stages can be entered
+    from several threads at once (NAV downloads), so their totals are the
+    summed time of all calls, not elapsed time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.meta = {}
+        # stage -> [calls, total seconds, slowest call seconds]
+        self.stages = {}
+        self.counters = {}
+        # (rule index, account, pattern) -> seconds spent matching it
+        self.pattern_costs = {}
+
+    def add(self, name, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_pattern_costs(self, costs):
+        with self.lock:
+            for key, seconds in costs:
+                self.pattern_costs[key] = self.pattern_costs.get(key, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def slowest_patterns(self, top=10):
+        return sorted(self.pattern_costs.items(), key=lambda item: -item[1])[:top]
+
+    def report(self, top=10):
+        """Returns the summary table as a string."""
+        total = time.perf_counter() - self.started
+        lines = [f"{'stage':<28} {'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'% wall':>7}"]
+        for name, (calls, seconds, slowest) in sorted(self.stages.items()):
+            lines.append(f"{name:<28} {calls:>7} {seconds:>9.3f} {seconds / calls * 1000:>9.2f} "
+                         f"{slowest * 1000:>9.2f} {seconds / total * 100 if total else 0:>6.1f}%")
+        lines.append(f"{'wall':<28} {'':>7} {total:>9.3f}")
+        if self.counters:
+            lines.append("")
+            lines += [f"{name:<28} {n:>7}" for name, n in sorted(self.counters.items())]
+        if self.pattern_costs:
+            lines.append("")
+            lines.append("Slowest patterns (rule, account, pattern, ms over all rows):")
+            for (idx, account, pattern), seconds in self.slowest_patterns(top):
+                lines.append(f"  {idx:>4} {account:<40} {pattern:<30} {seconds * 1000:>9.2f}")
+        return "\n".join(lines)
+
+    def to_dict(self, top=50):
+        return {
+            'version': PROFILE_FORMAT_VERSION,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'meta': self.meta,
+            'wall_seconds': time.perf_counter() - self.started,
+            'stages': {
+                name: {'calls': calls, 'seconds': seconds, 'max_seconds': slowest}
+                for name, (calls, seconds, slowest) in sorted(self.stages.items())
+            },
+            'counters': dict(sorted(self.counters.items())),
+            'slowest_patterns': [
+                {'rule': idx, 'account': account, 'pattern': pattern, 'seconds': seconds}
+                for (idx, account, pattern), seconds in self.slowest_patterns(top)
+            ],
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+_profiler = None
+
+
+def enable_profiling():
+    """Starts recording into a new Profiler and returns it."""
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def get_profiler():
+    """Returns the active Profiler, or None when profiling is off."""
+    return _profiler
+
+
+@contextmanager
+def stage(name):
+    """Times the block as `name` when profiling is on; free otherwise."""
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
+
+
+def count(name, n=1):
+    profiler = _profiler
+    if profiler is not None:
+        profiler.count(name, n)
@@ -0,0 +1,310 @@
+import math
+import re
+import time
+from collections import OrderedDict
+
+# Patterns made only of these characters are plain keywords and can go into the
+# keyword trie; anything else is treated as a real regex.
+LITERAL_PATTERN_RE = re.compile(r"[A-Za-z0-9 _\-/@&:,'=#]+")
+
+# Non-ASCII characters that re.IGNORECASE treats as equal to an ASCII letter.
+# Descriptions are folded with this before the keyword trie walk, so literal
+# keywords match exactly as they would in a case-insensitive regex.
+_CASE_FOLD = str.maketrans({
+    'İ': 'i',  # LATIN CAPITAL LETTER I WITH DOT ABOVE
+    'ı': 'i',  # LATIN SMALL LETTER DOTLESS I
+    'ſ': 's',  # LATIN SMALL LETTER LONG S
+    '\u212a': 'k',  # KELVIN SIGN
+})
+
+
+# Digit runs (reference IDs, UPI transaction numbers) are collapsed to one
+# marker in match memo keys, as clean_and_extract_keywords drops them
+_DIGITS_RE = re.compile(r'\d+')
+_DIGITS_MARK = '\0'
+
+# Distinct descriptions remembered by RuleMatcher.match
+DEFAULT_MEMO_SIZE = 50000
+
+
+def _lowest_bit(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+class RuleMatcher:
+    """Precompiled form of the account rules for fast description matching.
+
+    Gives the same result as determine: the first rule with
+    value_conditions whose pattern and amount both match, otherwise the first
+    rule without value_conditions whose pattern matches. match(in_order=True)
+    gives determine_in_order's result instead.
+
+    The pattern matches of recent descriptions are memoized (LRU, up to
+    `memo_size` entries, 0 disables). When every pattern is a digit-free
+    keyword, descriptions differing only in their numbers share an entry.
+    Amounts are checked on every call, so they are not part of the key.
+    """
+
+    def __init__(self, rules, memo_size=DEFAULT_MEMO_SIZE):
+        self.rules = rules
+        self.memo_size = memo_size
+        self.value_rules_mask = 0
+        self.plain_rules_mask = 0
+        # Character trie of the literal keywords (lowercase); the '' key of a
+        # node holds the bitmask of rules having the keyword that ends there.
+        # Plain dicts, so a pickled matcher loads without compiling anything.
+        self.literal_trie = {}
+        # rule index -> list of compiled regex patterns
+        self.regex_patterns = {}
+        # list-pattern keyword -> bit; each list pattern is (keyword bits, rule index)
+        self.all_of_bits = {}
+        self.all_of_patterns = []
+        # amount bucket (paise) -> [(amount, rule index)]
+        self.amount_index = {}
+
+        for idx, rule in enumerate(rules):
+            bit = 1 << idx
+            value_conditions = rule.get('value_conditions', [])
+            if value_conditions:
+                self.value_rules_mask |= bit
+                for cond in value_conditions:
+                    if 'amount' in cond:
+                        bucket = int(cond['amount'] * 100 // 1)
+                        self.amount_index.setdefault(bucket, []).append((cond['amount'], idx))
+            else:
+                self.plain_rules_mask |= bit
+
+            for pattern in rule.get('patterns', []):
+                if isinstance(pattern, list):
+                    keyword_bits = 0
+                    for keyword in pattern:
+                        keyword = keyword.lower()
+                        if keyword not in self.all_of_bits:
+                            self.all_of_bits[keyword] = 1 << len(self.all_of_bits)
+                        keyword_bits |= self.all_of_bits[keyword]
+                    self.all_of_patterns.append((keyword_bits, idx))
+                elif LITERAL_PATTERN_RE.fullmatch(pattern):
+                    node = self.literal_trie
+                    for ch in pattern.lower():
+                        node = node.setdefault(ch, {})
+                    node[''] = node.get('', 0) | bit
+                else:
+                    self.regex_patterns.setdefault(idx, []).append(re.compile(pattern, re.IGNORECASE))
+
+        # A keyword without digits matches inside one digit-free stretch of
+        # the description, so replacing the digit runs can't change the
+        # result. Regexes may look at digits; with any, keys stay exact.
+        keywords = list(self.all_of_bits) + list(self._iter_literal_keywords())
+        self.memo_normalizes = not self.regex_patterns and not any(
+            _DIGITS_RE.search(keyword) or _DIGITS_MARK in keyword for keyword in keywords)
+        self.memo = OrderedDict()
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def __getstate__(self):
+        # Pickled into the rules cache and to worker processes; start empty
+        state = self.__dict__.copy()
+        state.update(memo=OrderedDict(), memo_hits=0, memo_misses=0)
+        return state
+
+    def _iter_literal_keywords(self):
+        stack = [('', self.literal_trie)]
+        while stack:
+            prefix, node = stack.pop()
+            for ch, child in node.items():
+                if ch:
+                    stack.append((prefix + ch, child))
+                else:
+                    yield prefix
+
+    def _memo_key(self, description_lower):
+        if self.memo_normalizes:
+            return _DIGITS_RE.sub(_DIGITS_MARK, description_lower)
+        return description_lower
+
+    def _value_mask(self, value, exact=False):
+        mask = 0
+        if not math.isfinite(value):
+            return mask
+        bucket = int(value * 100 // 1)
+        for b in range(bucket - 2, bucket + 3):
+            for amount, idx in self.amount_index.get(b, ()):
+                if amount == value if exact else abs(amount - value) < 0.01:
+                    mask |= 1 << idx
+        return mask
+
+    def _literal_mask(self, description_lower):
+        # Walk the trie from every position; each keyword ending on the way
+        # is a substring of the description
+        mask = 0
+        trie = self.literal_trie
+        folded = description_lower.translate(_CASE_FOLD)
+        n = len(folded)
+        for start in range(n):
+            node = trie.get(folded[start])
+            i = start + 1
+            while node is not None:
+                mask |= node.get('', 0)
+                if i == n:
+                    break
+                node = node.get(folded[i])
+                i += 1
+        return mask
+
+    def _pattern_mask(self, description_lower, candidates):
+        mask = self._literal_mask(description_lower) if self.literal_trie else 0
+
+        if self.all_of_patterns:
+            present = 0
+            for keyword, bit in self.all_of_bits.items():
+                if keyword in description_lower:
+                    present |= bit
+            for keyword_bits, idx in self.all_of_patterns:
+                if present & keyword_bits == keyword_bits:
+                    mask |= 1 << idx
+
+        for idx, patterns in self.regex_patterns.items():
+            bit = 1 << idx
+            if mask & bit or not candidates & bit:
+                continue
+            if any(p.search(description_lower) for p in patterns):
+                mask |= bit
+        return mask
+
+    def _memo_mask(self, description_lower):
+        key = self._memo_key(description_lower)
+        memo = self.memo
+        mask = memo.get(key)
+        if mask is not None:
+            memo.move_to_end(key)
+            self.memo_hits += 1
+            return mask
+        self.memo_misses += 1
+        # Every rule is a candidate, so the mask is right for any amount
+        mask = self._pattern_mask(description_lower, self.value_rules_mask | self.plain_rules_mask)
+        memo[key] = mask
+        if len(memo) > self.memo_size:
+            memo.popitem(last=False)
+        return mask
+
+    def clear_memo(self):
+        self.memo.clear()
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def memo_hit_rate(self):
+        lookups = self.memo_hits + self.memo_misses
+        return self.memo_hits / lookups if lookups else 0.0
+
+    def match(self, description, value, in_order=False):
+        """Returns the matching rule for a statement line, or None."""
+        value_mask = self._value_mask(value, exact=in_order) if self.amount_index else 0
+        if self.memo_size > 0:
+            mask = self._memo_mask(description.lower())
+        else:
+            mask = self._pattern_mask(description.lower(), value_mask | self.plain_rules_mask)
+
+        if in_order:
+            hits = mask & (value_mask | self.plain_rules_mask)
+            return self.rules[_lowest_bit(hits)] if hits else None
+
+        hits = mask & value_mask
+        if hits:
+            return self.rules[_lowest_bit(hits)]
+        hits = mask & self.plain_rules_mask
+        if hits:
+            return self.rules[_lowest_bit(hits)]
+        return None
+
+    def pattern_costs(self, descriptions):
+        """Times each pattern against all `descriptions`, for profiling.
+
+        Returns [((rule index, account, pattern), seconds)]. Literal keywords
+        share one trie walk, so they are reported as a single entry; regex
+        and list patterns are timed one by one as if every rule were tried.
+        """
+        lowered = [description.lower() for description in descriptions]
+        costs = []
+        if self.literal_trie:
+            start = time.perf_counter()
+            for description_lower in lowered:
+                self._literal_mask(description_lower)
+            costs.append((('*', 'literal keywords', 'trie'), time.perf_counter() - start))
+        keywords_by_bit = {bit: keyword for keyword, bit in self.all_of_bits.items()}
+        for keyword_bits, idx in self.all_of_patterns:
+            keywords = [keyword for bit, keyword in keywords_by_bit.items() if keyword_bits & bit]
+            start = time.perf_counter()
+            for description_lower in lowered:
+                all(keyword in description_lower for keyword in keywords)
+            costs.append(((idx, self.rules[idx]['account'], str(keywords)), time.perf_counter() - start))
+        for idx, patterns in self.regex_patterns.items():
+            for pattern in patterns:
+                start = time.perf_counter()
+                for description_lower in lowered:
+                    pattern.search(description_lower)
+                costs.append(((idx, self.rules[idx]['account'], pattern.pattern), time.perf_counter() - start))
+        return costs
+
+    def match_many(self, descriptions, values, in_order=False):
+        """Returns the matching rule (or None) for each (description, value) pair."""
+        return [self.match(description, value, in_order) for description, value in zip(descriptions, values)]
+
+
+def is_all_keywords_present(description, keywords):
+    """Returns True if ALL keywords (case-insensitive) appear in description."""
+    description_lower = description.lower()
+    return all(keyword.lower() in description_lower for keyword in keywords)
+
+
+def determine(description, value, rules):
+    """Reference rule lookup, one rule and pattern at a time; RuleMatcher.match is the fast path."""
+    description_lower = description.lower()
+
+    # 1st pass: rules with value_conditions
+    for rule in rules:
+        value_conditions = rule.get('value_conditions', [])
+        if not value_conditions:
+            continue
+        for pattern in rule.get('patterns', []):
+            # Support for multi-keyword patterns as a list
+            if isinstance(pattern, list):
+                if is_all_keywords_present(description, pattern):
+                    for cond in value_conditions:
+                        if 'amount' in cond and abs(cond['amount'] - value) < 0.01:
+                            return rule
+            else:
+                if re.search(pattern, description_lower, re.IGNORECASE):
+                    for cond in value_conditions:
+                        if 'amount' in cond and abs(cond['amount'] - value) < 0.01:
+                            return rule
+
+    # 2nd pass: rules without value_conditions
+    for rule in rules:
+        if rule.get('value_conditions'):
+            continue
+        for pattern in rule.get('patterns', []):
+            if isinstance(pattern, list):
+                if is_all_keywords_present(description, pattern):
+                    return rule
+            else:
+                if re.search(pattern, description_lower, re.IGNORECASE):
+                    return rule
+    return None
+
+
+def determine_in_order(description, value, rules):
+    """convert.py's original rule lookup: the first rule in file order whose
+    pattern matches and whose value_conditions, if any, hold exactly."""
+    description_lower = description.lower()
+    for rule in rules:
+        for pattern in rule.get('patterns', []):
+            if re.search(pattern, description_lower, re.IGNORECASE):
+                value_conditions = rule.get('value_conditions', [])
+                if value_conditions:
+                    for cond in value_conditions:
+                        if 'amount' in cond and cond['amount'] == value:
+                            return rule
+                    continue
+                else:
+                    return rule
+    return None
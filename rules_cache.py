@@ -0,0 +1,90 @@
+import gc
+import hashlib
+import os
+import pickle
+
+import yaml
+
+from profiling import count, stage
+from rule_matcher import RuleMatcher
+
+# libyaml's C loader is several times faster than the pure-Python one
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Bump when RuleMatcher's attributes change, so stale caches are rebuilt
+RULES_CACHE_VERSION = 2
+
+
+def load_rules(config_file="account_rules.yaml"):
+    with open(config_file, "r") as f:
+        config = yaml.load(f, Loader=YAML_LOADER)
+    return config['rules'], config.get('mutual_funds', {})
+
+
+def rules_cache_file_for(rules_file):
+    return rules_file + ".cache.pickle"
+
+
+def _read_cache(cache_file, digest):
+    # The header is a separate pickle, so a stale cache is rejected before
+    # the (possibly large) matcher is unpickled
+    try:
+        with open(cache_file, 'rb') as f:
+            header = pickle.load(f)
+            if header != (RULES_CACHE_VERSION, digest):
+                return None
+            # The matcher is mostly small dicts; collecting while they are
+            # created makes loading several times slower
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(f)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError, ValueError):
+        return None
+
+
+def _write_cache(cache_file, digest, payload):
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump((RULES_CACHE_VERSION, digest), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # A read-only rules directory just means no cache
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def load_rule_matcher(rules_file, use_cache=True):
+    """Returns (matcher, mutual_funds) for a rules YAML.
+
+    The compiled RuleMatcher is pickled next to the YAML and reused while
+    the YAML's SHA-256 is unchanged, so the YAML is only parsed after it
+    is edited or regenerated. The cache is trusted like the rules file
+    itself; don't point this at a directory others can write to.
+    """
+    if not use_cache:
+        with stage('load_rules.yaml'):
+            rules, mutual_funds = load_rules(rules_file)
+        with stage('load_rules.compile'):
+            return RuleMatcher(rules), mutual_funds
+
+    with open(rules_file, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    cache_file = rules_cache_file_for(rules_file)
+    with stage('load_rules.cache_read'):
+        payload = _read_cache(cache_file, digest)
+    if payload is None:
+        count('rules cache misses')
+        with stage('load_rules.yaml'):
+            rules, mutual_funds = load_rules(rules_file)
+        with stage('load_rules.compile'):
+            payload = (RuleMatcher(rules), mutual_funds)
+        _write_cache(cache_file, digest, payload)
+    else:
+        count('rules cache hits')
+    return payload
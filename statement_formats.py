@@ -0,0 +1,198 @@
+import importlib.util
+import os
+
+from profiling import count
+
+# Columns of the frame every reader yields, whatever the bank:
+# date (datetime64), description (str), withdrawal and deposit (float, >= 0)
+STATEMENT_COLUMNS = ['date', 'description', 'withdrawal', 'deposit']
+
+EXCEL_EXTENSIONS = ('.xls', '.xlsx', '.xlsm')
+
+# Lines searched for the header row; bank exports often start with the
+# account holder's details
+HEADER_SEARCH_LINES = 30
+
+
+class StatementFormat:
+    """Schema of one bank's statement export.
+
+    Names the date, description and amount columns, and declares the date
+    format and amount dtype up front, so a statement is parsed in one typed
+    pass instead of pandas inferring every column. Amounts are either a
+    withdrawal and a deposit column or a single signed `amount_column`
+    (negative for withdrawals). `account` is the GnuCash account of the
+    bank's splits, unless the caller names another.
+    """
+
+    def __init__(self, name, date_column, description_column, withdrawal_column=None, deposit_column=None,
+                 amount_column=None, date_format='%d/%m/%Y', thousands=None, account=None):
+        if amount_column is None and (withdrawal_column is None or deposit_column is None):
+            raise ValueError(f"Statement format '{name}' needs withdrawal and deposit columns or an amount column")
+        self.name = name
+        self.date_column = date_column
+        self.description_column = description_column
+        self.withdrawal_column = withdrawal_column
+        self.deposit_column = deposit_column
+        self.amount_column = amount_column
+        self.date_format = date_format
+        self.thousands = thousands
+        self.account = account
+
+    @property
+    def columns(self):
+        amount_columns = [self.amount_column] if self.amount_column else [self.withdrawal_column, self.deposit_column]
+        return [self.date_column, self.description_column] + amount_columns
+
+    def matches(self, header):
+        header = {str(name).strip() for name in header}
+        return all(column in header for column in self.columns)
+
+    def normalize(self, df):
+        """Returns the STATEMENT_COLUMNS frame of a frame read with this format."""
+        import numpy as np
+        import pandas as pd
+
+        df = df.rename(columns=lambda name: str(name).strip())
+        dates = df[self.date_column]
+        if dates.dtype.kind != 'M':
+            # Excel cells may already be dates; everything else is parsed with the declared format
+            dates = pd.to_datetime(dates.astype(str).str.strip(), format=self.date_format)
+        if self.amount_column:
+            amount = self._amounts(df[self.amount_column])
+            withdrawal = np.where(amount < 0, -amount, 0.0)
+            deposit = np.where(amount > 0, amount, 0.0)
+        else:
+            withdrawal = self._amounts(df[self.withdrawal_column])
+            deposit = self._amounts(df[self.deposit_column])
+        return pd.DataFrame({
+            'date': dates.to_numpy(dtype='datetime64[D]'),
+            'description': df[self.description_column].fillna('').astype(str).to_numpy(dtype=object),
+            'withdrawal': withdrawal,
+            'deposit': deposit,
+        }, columns=STATEMENT_COLUMNS)
+
+    def _amounts(self, column):
+        import pandas as pd
+
+        if column.dtype.kind not in 'fiu':
+            # Excel text cells, or amounts like '1,234.50'
+            column = column.astype(str).str.strip()
+            if self.thousands:
+                column = column.str.replace(self.thousands, '', regex=False)
+            column = pd.to_numeric(column.replace({'': None, 'nan': None}))
+        return column.fillna(0.0).to_numpy(dtype=float)
+
+
+STATEMENT_FORMATS = {}
+
+
+def register_format(statement_format):
+    """Adds a StatementFormat to the registry; returns it."""
+    STATEMENT_FORMATS[statement_format.name] = statement_format
+    return statement_format
+
+
+register_format(StatementFormat(
+    'icici', 'Value Date', 'Transaction Remarks', 'Withdrawal Amount (INR )', 'Deposit Amount (INR )',
+    account='Assets:Current Assets:Savings - ICICI'))
+register_format(StatementFormat(
+    'hdfc', 'Date', 'Narration', 'Withdrawal Amt.', 'Deposit Amt.', date_format='%d/%m/%y', thousands=',',
+    account='Assets:Current Assets:Savings - HDFC'))
+register_format(StatementFormat(
+    'sbi', 'Txn Date', 'Description', 'Debit', 'Credit', date_format='%d %b %Y', thousands=',',
+    account='Assets:Current Assets:Savings - SBI'))
+
+
+def _has_pyarrow():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def is_excel(path):
+    return path.lower().endswith(EXCEL_EXTENSIONS)
+
+
+def _header_lines(path):
+    """Returns the first HEADER_SEARCH_LINES rows of a statement as lists of cells."""
+    import csv
+
+    import pandas as pd
+
+    if is_excel(path):
+        head = pd.read_excel(path, header=None, nrows=HEADER_SEARCH_LINES, dtype=str)
+        return [[cell for cell in row if isinstance(cell, str)] for row in head.itertuples(index=False)]
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = []
+        for row in csv.reader(f):
+            rows.append(row)
+            if len(rows) == HEADER_SEARCH_LINES:
+                break
+        return rows
+
+
+def detect_format(path, name=None):
+    """Returns (StatementFormat, header row number) of a statement file.
+
+    With a `name` that format is used; otherwise the first registered
+    format whose columns are all in one of the file's first lines.
+    """
+    formats = [STATEMENT_FORMATS[name]] if name else list(STATEMENT_FORMATS.values())
+    for line_number, row in enumerate(_header_lines(path)):
+        for statement_format in formats:
+            if statement_format.matches(row):
+                return statement_format, line_number
+    if name:
+        raise ValueError(f"'{path}' doesn't have the columns of the '{name}' format: "
+                         f"{', '.join(STATEMENT_FORMATS[name].columns)}")
+    raise ValueError(f"Can't tell the bank of '{path}'; known formats: {', '.join(STATEMENT_FORMATS)}")
+
+
+def read_statement(path, format_name=None, chunksize=None):
+    """Yields a statement as STATEMENT_COLUMNS frames, `chunksize` rows at a time.
+
+    The format is detected from the header unless `format_name` is given.
+    CSVs are read with only the format's columns and their dtypes declared,
+    with pandas' pyarrow engine when pyarrow is installed and the whole file
+    is read at once. Excel files (.xls needs xlrd, .xlsx openpyxl) are read
+    whole and then split into chunks.
+    """
+    import pandas as pd
+
+    statement_format, header_row = detect_format(path, format_name)
+    columns = statement_format.columns
+    if is_excel(path):
+        df = pd.read_excel(path, skiprows=header_row, dtype={statement_format.description_column: str})
+        df = df.rename(columns=lambda name: str(name).strip())[columns]
+        step = chunksize or max(len(df), 1)
+        frames = (df.iloc[start:start + step] for start in range(0, len(df), step))
+    else:
+        dtype = {column: float for column in columns}
+        dtype.update({statement_format.date_column: str, statement_format.description_column: str})
+        options = dict(skiprows=header_row, usecols=columns, dtype=dtype, encoding='utf-8-sig')
+        # Some banks pad empty amount cells with a space
+        c_options = dict(options, thousands=statement_format.thousands, skipinitialspace=True)
+        if chunksize:
+            frames = pd.read_csv(path, chunksize=chunksize, **c_options)
+        elif _has_pyarrow() and not statement_format.thousands:
+            # The pyarrow engine reads the whole file at once and has no thousands separator
+            frames = iter([pd.read_csv(path, engine='pyarrow', **options)])
+        else:
+            frames = iter([pd.read_csv(path, **c_options)])
+    for df in frames:
+        count('statement rows', len(df))
+        yield statement_format.normalize(df)
+
+
+def format_dates(dates, date_format='%d/%m/%Y'):
+    """Formats a datetime64 array as strings; each distinct date is formatted once."""
+    import numpy as np
+    import pandas as pd
+
+    unique, inverse = np.unique(np.asarray(dates, dtype='datetime64[D]'), return_inverse=True)
+    return pd.DatetimeIndex(unique).strftime(date_format).to_numpy(dtype=object)[inverse]
+
+
+def statement_files_in(directory):
+    """Statement files (CSV and Excel) directly in `directory`."""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(('.csv',) + EXCEL_EXTENSIONS))
@@ -0,0 +1,148 @@
+import shutil
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+import piecash
+import pytest
+
+import synth
+from book_writer import BookWriter
+
+FUND_ACCOUNT = f'Assets:{synth.MF_HOUSE} Flexi Cap'
+
+
+@pytest.fixture(scope='module')
+def base_book(tmp_path_factory):
+    path = tmp_path_factory.mktemp('book') / 'base.gnucash'
+    synth.make_book(str(path), transactions=500)
+    return path
+
+
+@pytest.fixture
+def multi_split_df():
+    # convert_statement's layout: bank split, counter split and, for MF
+    # purchases, a stamp duty split
+    rows = []
+    for i in range(300):
+        transaction_id = str(uuid.UUID(int=i + 1, version=4))
+        post_date = f'{i % 28 + 1:02d}/{i % 12 + 1:02d}/2025'
+        if i % 10 == 0:
+            price = 40 + i / 100
+            rows += [
+                (transaction_id, post_date, f'SIP {i}', 'Assets:Savings - ICICI', -5000.0, 5000.0, ''),
+                (transaction_id, post_date, f'SIP {i}', FUND_ACCOUNT, 4999.75 / price, 4999.75, price),
+                (transaction_id, post_date, f'SIP {i}', 'Expenses:Food', 0.25, 0.25, ''),
+            ]
+        else:
+            amount = 100 + i * 1.37
+            rows += [
+                (transaction_id, post_date, f'UPI {i}', 'Assets:Savings - ICICI', -amount, amount, ''),
+                (transaction_id, post_date, f'UPI {i}', 'Expenses:Travel', amount, amount, ''),
+            ]
+    return pd.DataFrame(rows, columns=['TransactionID', 'date', 'description', 'Full Account Name',
+                                       'Amount', 'Value', 'price'])
+
+
+def _write(base_book, tmp_path, df, method, dry_run=False, create_accounts=False):
+    path = tmp_path / f'{method}.gnucash'
+    shutil.copy(base_book, path)
+    writer = BookWriter(str(path), dry_run=dry_run, create_accounts=create_accounts, method=method, backup=False)
+    writer.write(df)
+    return path, writer.close()
+
+
+def _summary(path):
+    book = piecash.open_book(str(path), open_if_lock=True)
+    try:
+        balances = defaultdict(Decimal)
+        quantities = defaultdict(Decimal)
+        transactions = {}
+        for transaction in book.transactions:
+            assert sum(split.value for split in transaction.splits) == 0
+            transactions[transaction.guid] = (
+                transaction.post_date, transaction.description,
+                sorted((split.account.fullname, split.value, split.quantity) for split in transaction.splits))
+            for split in transaction.splits:
+                balances[split.account.fullname] += split.value
+                quantities[split.account.fullname] += split.quantity
+        prices = sorted((price.commodity.mnemonic, price.date, price.value) for price in book.prices)
+    finally:
+        book.close()
+    return transactions, dict(balances), dict(quantities), prices
+
+
+def test_sql_and_orm_write_the_same_book(base_book, tmp_path, multi_split_df):
+    sql_path, sql_counts = _write(base_book, tmp_path, multi_split_df, 'sql')
+    orm_path, orm_counts = _write(base_book, tmp_path, multi_split_df, 'orm')
+    assert sql_counts == orm_counts == (300, 630, 30, [])
+
+    sql_transactions, sql_balances, sql_quantities, sql_prices = _summary(sql_path)
+    orm_transactions, orm_balances, orm_quantities, orm_prices = _summary(orm_path)
+    assert sql_transactions == orm_transactions
+    assert sql_balances == orm_balances
+    assert sql_quantities == orm_quantities
+    assert sql_prices == orm_prices
+
+    base_transactions, base_balances, base_quantities, base_prices = _summary(base_book)
+    fund = multi_split_df[multi_split_df['Full Account Name'] == FUND_ACCOUNT]
+    assert len(sql_transactions) == len(base_transactions) + 300
+    assert sql_balances[FUND_ACCOUNT] - base_balances[FUND_ACCOUNT] == Decimal('4999.75') * len(fund)
+    units = sql_quantities[FUND_ACCOUNT] - base_quantities[FUND_ACCOUNT]
+    assert units == sum(round(Decimal(amount), 3) for amount in fund['Amount'])
+    assert len(sql_prices) == len(base_prices) + len(fund)
+    assert {(day, value) for _, day, value in set(sql_prices) - set(base_prices)} == {
+        (datetime.strptime(date, '%d/%m/%Y').date(), Decimal(str(price)))
+        for date, price in zip(fund['date'], fund['price'])}
+
+
+@pytest.mark.parametrize('method', ['sql', 'orm'])
+def test_dry_run_leaves_the_book_untouched(base_book, tmp_path, multi_split_df, method):
+    path, counts = _write(base_book, tmp_path, multi_split_df, method, dry_run=True)
+    assert counts[0] == 300
+    assert path.read_bytes() == base_book.read_bytes()
+
+
+def test_fund_split_needs_a_fund_account(base_book, tmp_path, multi_split_df):
+    path = tmp_path / 'fund.gnucash'
+    shutil.copy(base_book, path)
+    df = multi_split_df.replace({FUND_ACCOUNT: 'Assets:Mutual Funds:New'})
+    writer = BookWriter(str(path), create_accounts=True, backup=False)
+    with pytest.raises(ValueError, match='Fund account'):
+        writer.write(df)
+    writer.abort()
+    assert path.read_bytes() == base_book.read_bytes()
+
+
+def test_mf_redemption_takes_units_out_of_the_fund(base_book, tmp_path, monkeypatch):
+    import mf_nav_util
+    from conversion import convert_statement
+    from rule_matcher import RuleMatcher
+
+    monkeypatch.setattr(mf_nav_util, 'get_imported_navs', lambda lookups: dict.fromkeys(range(len(lookups)), 50.0))
+    matcher = RuleMatcher([{
+        'account': FUND_ACCOUNT,
+        'patterns': [synth.MF_HOUSE.lower()],
+        'mutual_fund': {'fund_house': synth.MF_HOUSE, 'amfi_scheme_code': str(synth.MF_SCHEME_CODE),
+                        'price_determine': True},
+    }])
+    bank_df = pd.DataFrame({
+        'date': pd.to_datetime(['2025-03-03', '2025-03-10']),
+        'description': [f'ACH/{synth.MF_HOUSE} MUTUAL FUND/1', f'REDEMPTION {synth.MF_HOUSE} MUTUAL FUND/2'],
+        'withdrawal': [10000.0, 0.0],
+        'deposit': [0.0, 5000.0],
+    })
+    df, unmatched = convert_statement(bank_df, matcher, {synth.MF_HOUSE: {'mf_number': synth.MF_NUMBER}},
+                                      ['redemption-1', 'redemption-2'], bank_account='Assets:Savings - ICICI')
+    assert unmatched == 0
+    # The redemption has no stamp duty split
+    assert len(df) == 5
+
+    path, counts = _write(base_book, tmp_path, df, 'sql', create_accounts=True)
+    assert counts[:2] == (2, 5)
+    _, base_balances, base_quantities, _ = _summary(base_book)
+    _, balances, quantities, _ = _summary(path)
+    assert balances[FUND_ACCOUNT] - base_balances[FUND_ACCOUNT] == Decimal('9999.50') - Decimal('5000')
+    assert quantities[FUND_ACCOUNT] - base_quantities[FUND_ACCOUNT] == Decimal('199.990') - Decimal('100')
@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conversion import BANK_ACCOUNT, UNMATCHED_ACCOUNT, V1_BANK_ACCOUNT, V1_UNMATCHED_ACCOUNT, convert_file
+from rule_matcher import determine
+from rules_cache import load_rule_matcher, load_rules
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+STATEMENT = os.path.join(FIXTURES, 'icici_statement.csv')
+RULES = os.path.join(FIXTURES, 'rules.yaml')
+
+
+@pytest.fixture(scope='module')
+def rule_matcher():
+    return load_rule_matcher(RULES, use_cache=False)
+
+
+def _convert(tmp_path, rule_matcher, name, **options):
+    matcher, mutual_funds = rule_matcher
+    output_file = tmp_path / name
+    total, unmatched = convert_file(STATEMENT, str(output_file), matcher, mutual_funds, **options)
+    return pd.read_csv(output_file, keep_default_na=False), total, unmatched
+
+
+def test_same_splits_as_compat_v1(tmp_path, rule_matcher):
+    df, total, unmatched = _convert(tmp_path, rule_matcher, 'v2.csv', seed=1)
+    v1_df, v1_total, v1_unmatched = _convert(tmp_path, rule_matcher, 'v1.csv', compat='v1')
+    assert (total, unmatched) == (v1_total, v1_unmatched) == (12, 2)
+
+    # v1 has no TransactionID and names the bank and unmatched accounts differently
+    transaction_ids = df['TransactionID'][::2].tolist()
+    assert df['TransactionID'].tolist() == [transaction_id for transaction_id in transaction_ids for _ in range(2)]
+    df = df.drop(columns='TransactionID').replace(
+        {'Full Account Name': {BANK_ACCOUNT: V1_BANK_ACCOUNT, UNMATCHED_ACCOUNT: V1_UNMATCHED_ACCOUNT}})
+    pd.testing.assert_frame_equal(df, v1_df)
+
+
+def test_accounts_match_row_by_row_lookup(tmp_path, rule_matcher):
+    df, _, _ = _convert(tmp_path, rule_matcher, 'v2.csv', seed=1)
+    rules, _ = load_rules(RULES)
+    statement = pd.read_csv(STATEMENT, skiprows=3, keep_default_na=False)
+    expected = []
+    for _, row in statement.iterrows():
+        value = row['Withdrawal Amount (INR )'] or row['Deposit Amount (INR )']
+        rule = determine(str(row['Transaction Remarks']), value, rules)
+        expected.append(rule['account'] if rule else UNMATCHED_ACCOUNT)
+    assert df['Full Account Name'][1::2].tolist() == expected
+    assert df['Full Account Name'][::2].tolist() == [BANK_ACCOUNT] * len(statement)
+    assert df['Amount'][::2].sum() == pytest.approx(
+        statement['Deposit Amount (INR )'].sum() - statement['Withdrawal Amount (INR )'].sum())
+
+
+def test_chunked_conversion_matches_whole_file(tmp_path, rule_matcher):
+    df, _, _ = _convert(tmp_path, rule_matcher, 'whole.csv', seed=1)
+    chunked_df, total, _ = _convert(tmp_path, rule_matcher, 'chunked.csv', seed=1, chunksize=5)
+    assert total == 12
+    pd.testing.assert_frame_equal(chunked_df, df)
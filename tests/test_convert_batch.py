@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+from convert_batch import output_names
+
+
+def test_output_names_keep_stems_when_unique():
+    assert output_names(['a/jan.csv', 'b/feb.xlsx']) == ['jan_gnucash.csv', 'feb_gnucash.csv']
+
+
+def test_output_names_tell_apart_statements_sharing_a_stem(tmp_path):
+    paths = [str(tmp_path / 'a' / 'jan.csv'), str(tmp_path / 'b' / 'jan.csv'),
+             str(tmp_path / 'b' / 'jan.xlsx'), str(tmp_path / 'feb.csv')]
+    names = output_names(paths)
+    assert names == ['a_jan_csv_gnucash.csv', 'b_jan_csv_gnucash.csv', 'b_jan_xlsx_gnucash.csv', 'feb_gnucash.csv']
+    assert all(os.sep not in name for name in names)
+
+
+def test_merge_reports_failing_statements_and_cleans_up(tmp_path):
+    import synth
+
+    rules = tmp_path / 'rules.yaml'
+    synth.make_rules(str(rules), accounts=5, patterns=5)
+    synth.make_statement(str(tmp_path / 'good.csv'), rows=50, mf_share=0)
+    (tmp_path / 'bad.csv').write_text('Date,Narration\n01/01/2025,unknown bank\n')
+    work_root = tmp_path / 'tmp'
+    work_root.mkdir()
+    merged = tmp_path / 'merged.csv'
+
+    result = subprocess.run(
+        [sys.executable, 'convert_batch.py', str(tmp_path / 'good.csv'), str(tmp_path / 'bad.csv'),
+         '--rules', str(rules), '--merge', str(merged), '--workers', '1', '--no-rules-cache'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**os.environ, 'TMPDIR': str(work_root)}, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert f"Error: {tmp_path / 'bad.csv'}:" in result.stdout
+    assert f"{tmp_path / 'good.csv'}: 50 transactions" in result.stdout
+    assert not merged.exists()
+    assert list(work_root.iterdir()) == []
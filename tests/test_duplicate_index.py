@@ -0,0 +1,93 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+import duplicate_index
+import synth
+from duplicate_index import DuplicateIndex, duplicate_index_file_for
+
+BANK_ACCOUNT = 'Assets:Savings - ICICI'
+FUND_ACCOUNT = f'Assets:{synth.MF_HOUSE} Flexi Cap'
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / 'book.gnucash'
+    synth.make_book(str(path), transactions=200)
+    return str(path)
+
+
+@pytest.fixture
+def book_reads(monkeypatch):
+    reads = []
+    read_book_keys = duplicate_index.read_book_keys
+
+    def counting_read_book_keys(book_file, account):
+        reads.append(account)
+        return read_book_keys(book_file, account)
+
+    monkeypatch.setattr(duplicate_index, 'read_book_keys', counting_read_book_keys)
+    return reads
+
+
+def test_sidecar_keeps_each_accounts_keys(book, book_reads):
+    bank = DuplicateIndex.for_book(book, BANK_ACCOUNT)
+    fund = DuplicateIndex.for_book(book, FUND_ACCOUNT)
+    for _ in range(2):
+        assert DuplicateIndex.for_book(book, BANK_ACCOUNT).keys == bank.keys
+        assert DuplicateIndex.for_book(book, FUND_ACCOUNT).keys == fund.keys
+    assert book_reads == [BANK_ACCOUNT, FUND_ACCOUNT]
+    assert len(bank.keys) == 200
+    assert 0 < len(fund.keys) < 200
+
+
+def test_stale_sidecar_is_read_again(book, book_reads):
+    DuplicateIndex.for_book(book, BANK_ACCOUNT)
+    DuplicateIndex.for_book(book, FUND_ACCOUNT)
+    os.utime(book, ns=(0, 0))
+    DuplicateIndex.for_book(book, FUND_ACCOUNT)
+    DuplicateIndex.for_book(book, BANK_ACCOUNT)
+    assert book_reads == [BANK_ACCOUNT, FUND_ACCOUNT, FUND_ACCOUNT, BANK_ACCOUNT]
+
+
+@pytest.mark.parametrize('touched', [(BANK_ACCOUNT, 'Expenses:Food'), (BANK_ACCOUNT, FUND_ACCOUNT)])
+def test_save_drops_other_accounts_touched_by_the_added_rows(book, book_reads, touched):
+    fund = DuplicateIndex.for_book(book, FUND_ACCOUNT)
+    bank = DuplicateIndex.for_book(book, BANK_ACCOUNT)
+    bank.add([date(2025, 1, 2)], [-250.0], ['UPI/Lunch'], accounts=touched)
+    os.utime(book, ns=(1, 1))
+    bank.save(book)
+    with open(duplicate_index_file_for(book)) as f:
+        accounts = json.load(f)['accounts']
+    assert accounts[BANK_ACCOUNT] == bank.keys + ['2025-01-02|-25000|upi/lunch']
+    assert DuplicateIndex.for_book(book, BANK_ACCOUNT).keys == accounts[BANK_ACCOUNT]
+    assert DuplicateIndex.for_book(book, FUND_ACCOUNT).keys == fund.keys
+    # The fund account is read again only when the added transactions have splits in it
+    assert book_reads == [FUND_ACCOUNT, BANK_ACCOUNT] + ([FUND_ACCOUNT] if FUND_ACCOUNT in touched else [])
+
+
+def test_rerun_into_the_book_skips_the_written_rows(book, book_reads):
+    from book_writer import BookWriter
+    from conversion import convert_file
+    from rules_cache import load_rule_matcher
+
+    fixtures = os.path.join(os.path.dirname(__file__), 'fixtures')
+    statement = os.path.join(fixtures, 'icici_statement.csv')
+    matcher, mutual_funds = load_rule_matcher(os.path.join(fixtures, 'rules.yaml'), use_cache=False)
+
+    def convert_into_book(seed):
+        index = DuplicateIndex.for_book(book, BANK_ACCOUNT)
+        writer = BookWriter(book, create_accounts=True, backup=False)
+        total, _ = convert_file(statement, book, matcher, mutual_funds, seed=seed, book_writer=writer,
+                                duplicate_index=index, bank_account=BANK_ACCOUNT)
+        transactions = writer.close()[0]
+        index.save(book)
+        return total, transactions, index.duplicates
+
+    assert convert_into_book(1) == (12, 12, 0)
+    assert convert_into_book(2) == (0, 0, 12)
+    # The rerun's index came from the sidecar saved after the first write
+    assert book_reads == [BANK_ACCOUNT]
+    assert len(DuplicateIndex.for_book(book, BANK_ACCOUNT, use_sidecar=False).keys) == 212
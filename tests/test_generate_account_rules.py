@@ -0,0 +1,93 @@
+import piecash
+import pytest
+
+import synth
+from generate_account_rules import build_rules, iter_splits_sql, new_rules_state, update_rules_state
+
+
+@pytest.fixture(scope='module')
+def synth_book(tmp_path_factory):
+    path = tmp_path_factory.mktemp('rules') / 'book.gnucash'
+    synth.make_book(str(path), transactions=1500)
+    return path
+
+
+def _rules(book_path):
+    book = piecash.open_book(str(book_path), open_if_lock=True)
+    try:
+        state = update_rules_state(new_rules_state(), iter_splits_sql(book), workers=1)
+    finally:
+        book.close()
+    return {rule['account']: rule['patterns'] for rule in build_rules(state)['rules']}
+
+
+def test_noise_words_do_not_become_patterns(synth_book):
+    patterns = _rules(synth_book)
+    noise = set(synth.NOISE) | {'yesb', 'okaxis', 'imps', 'billdesk', 'services', 'store'}
+    assert not {keyword for keywords in patterns.values() for keyword in keywords} & noise
+    for account, merchants in synth.MERCHANTS.items():
+        assert set(patterns[f'Expenses:{account}']) == set(merchants)
+
+
+def _edit(book_path, *statements):
+    import sqlite3
+    conn = sqlite3.connect(str(book_path))
+    with conn:
+        for statement in statements:
+            conn.execute(statement)
+    conn.close()
+
+
+def _add_transactions(book_path, count):
+    import uuid
+
+    import pandas as pd
+
+    from book_writer import BookWriter
+    rows = []
+    for i in range(count):
+        transaction_id = str(uuid.uuid4())
+        description = f'UPI/swiggy.new{i}@ybl/PAYMENT'
+        rows += [(transaction_id, '05/01/2025', description, 'Assets:Savings - ICICI', -120.0, 120.0, ''),
+                 (transaction_id, '05/01/2025', description, 'Expenses:Food', 120.0, 120.0, '')]
+    writer = BookWriter(str(book_path), backup=False)
+    writer.write(pd.DataFrame(rows, columns=['TransactionID', 'date', 'description', 'Full Account Name',
+                                             'Amount', 'Value', 'price']))
+    writer.close()
+
+
+@pytest.mark.parametrize('edit', ['add', 'rename', 'reparent', 'retype', 'commodity', 'description', 'amount'])
+def test_incremental_output_matches_a_full_rebuild(tmp_path, capsys, edit):
+    from generate_account_rules import generate_account_rules
+
+    book = tmp_path / 'book.gnucash'
+    synth.make_book(str(book), transactions=300)
+    incremental_yaml = str(tmp_path / 'incremental.yaml')
+    full_yaml = str(tmp_path / 'full.yaml')
+    generate_account_rules(str(book), incremental_yaml, incremental=True, workers=1)
+
+    if edit == 'add':
+        _add_transactions(book, 20)
+    elif edit == 'rename':
+        _edit(book, "UPDATE accounts SET name = 'Groceries' WHERE name = 'Food'")
+    elif edit == 'reparent':
+        _edit(book, "UPDATE accounts SET parent_guid = (SELECT guid FROM accounts WHERE name = 'Assets')"
+                    " WHERE name = 'Rent'")
+    elif edit == 'retype':
+        _edit(book, "UPDATE accounts SET account_type = 'ASSET' WHERE name = 'Travel'")
+    elif edit == 'commodity':
+        _edit(book, f"UPDATE commodities SET mnemonic = '64009' WHERE mnemonic = '{synth.MF_SCHEME_CODE}'")
+    elif edit == 'description':
+        _edit(book, "UPDATE transactions SET description = 'zomato order' WHERE guid IN "
+                    "(SELECT tx_guid FROM splits JOIN accounts ON accounts.guid = splits.account_guid"
+                    " WHERE accounts.name = 'Fuel' LIMIT 3)")
+    else:
+        _edit(book, "UPDATE splits SET value_num = value_num * 3, quantity_num = quantity_num * 3 WHERE tx_guid = "
+                    "(SELECT tx_guid FROM splits LIMIT 1)")
+    capsys.readouterr()
+    generate_account_rules(str(book), incremental_yaml, incremental=True, workers=1)
+    output = capsys.readouterr().out
+    assert ('Incremental update: 20 new transactions.' in output) == (edit == 'add')
+    generate_account_rules(str(book), full_yaml, workers=1)
+    with open(incremental_yaml) as f, open(full_yaml) as g:
+        assert f.read() == g.read()
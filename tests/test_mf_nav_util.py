@@ -0,0 +1,36 @@
+from datetime import date
+
+import pytest
+
+import mf_nav_util
+
+
+@pytest.fixture
+def empty_nav_cache(monkeypatch):
+    from collections import defaultdict
+    monkeypatch.setattr(mf_nav_util, 'nav_cache', {})
+    monkeypatch.setattr(mf_nav_util, 'nav_indexes', {})
+    monkeypatch.setattr(mf_nav_util, 'nav_cache_ranges', defaultdict(list))
+    monkeypatch.setattr(mf_nav_util, 'get_nav_store', lambda: None)
+
+
+def test_ranges_without_nav_data_answer_none_without_refetching(empty_nav_cache, monkeypatch, capsys):
+    requests = []
+
+    def no_data(mf_number, from_date, to_date):
+        requests.append((mf_number, from_date, to_date))
+        raise ValueError("No valid NAV data lines found")
+
+    monkeypatch.setattr(mf_nav_util, 'fetch_nav_data', no_data)
+    lookups = [(64, date(2024, 3, 4)), (64, date(2024, 3, 8))]
+    mf_nav_util.prefetch_navs(lookups)
+    assert requests == [(64, '04-Mar-2024', '08-Mar-2024')]
+    assert 'Warning: no NAV data for mf=64 04-Mar-2024 - 08-Mar-2024' in capsys.readouterr().out
+
+    assert mf_nav_util.get_navs_for_dates([(64, '64001', day) for _, day in lookups]) == [None, None]
+    assert mf_nav_util.get_nav_for_date(64, '64001', '05/03/2024') is None
+    assert len(requests) == 1
+
+    # Outside the prefetched range: one single-day request, then None as well
+    assert mf_nav_util.get_navs_for_dates([(64, '64001', date(2024, 4, 1))]) == [None]
+    assert requests[1:] == [(64, '01-Apr-2024', '01-Apr-2024')]
@@ -0,0 +1,89 @@
+import os
+from datetime import date
+
+import pytest
+
+import mf_nav_util
+from nav_store import NavStore, import_bulk_files, merge_ranges, read_bulk_nav_file
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+HISTORY = os.path.join(FIXTURES, 'nav_history.txt')
+SNAPSHOT = os.path.join(FIXTURES, 'NAVAll_20250103.txt')
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NavStore(str(tmp_path / 'navs.sqlite3'))
+    yield store
+    store.close()
+
+
+def test_read_history_report():
+    rows, fields = read_bulk_nav_file(HISTORY, ['64001'])
+    assert fields == 8
+    # Only 64001's well-formed lines; not 640010 or the truncated line
+    assert {code for code, _, _, _ in rows} == {'64001'}
+    assert len(rows) == 8
+    assert rows[0] == ('64001', 'Parag Parikh Flexi Cap Fund - Direct Plan - Growth', 80.23, date(2024, 12, 23))
+    assert [nav for _, _, nav, day in rows if day == date(2024, 12, 27)] == [None]
+
+
+def test_read_navall_snapshot():
+    rows, fields = read_bulk_nav_file(SNAPSHOT, ['64002', '9002'])
+    assert fields == 6
+    assert sorted(rows) == [
+        ('64002', 'Parag Parikh Flexi Cap Fund - Regular Plan - Growth', None, date(2025, 1, 3)),
+        ('9002', 'HDFC Flexi Cap Fund - Growth', 1790.12, date(2025, 1, 3)),
+    ]
+
+
+def test_read_rejects_other_files(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text('Value Date,Transaction Remarks\n')
+    with pytest.raises(ValueError, match='not an AMFI NAV file'):
+        read_bulk_nav_file(str(path), ['64001'])
+
+
+def test_merge_ranges_bridges_weekends():
+    from nav_calendar import get_nav_calendar
+    friday, monday = date(2025, 1, 3), date(2025, 1, 6)
+    assert merge_ranges([(monday, monday), (friday, friday)], get_nav_calendar()) == [(friday, monday)]
+    assert merge_ranges([(monday, monday), (friday, friday)]) == [(friday, friday), (monday, monday)]
+
+
+def test_imported_lookups(store):
+    schemes = {'64001': {64}, '64002': {64}}
+    imported, found, ranges = import_bulk_files([HISTORY, SNAPSHOT], schemes, store=store)
+    assert imported == 18 and found == {'64001': 9, '64002': 9}
+    # The snapshot day touches the history report's last day
+    assert ranges[64, '64001'] == [(date(2024, 12, 23), date(2025, 1, 3))]
+
+    assert store.imported_nav(64, '64001', date(2024, 12, 24)) == (True, 80.24)
+    # No row on the 25th: the latest NAV before it
+    assert store.imported_nav(64, '64001', date(2024, 12, 25)) == (True, 80.24)
+    assert store.imported_nav(64, '64001', date(2025, 1, 3)) == (True, 81.03)
+    # N.A. in the file
+    assert store.imported_nav(64, '64001', date(2024, 12, 27)) == (True, None)
+    assert store.imported_nav(64, '64002', date(2025, 1, 3)) == (True, None)
+    # Outside the imported dates, or a scheme that wasn't imported: needs a download
+    assert store.imported_nav(64, '64001', date(2024, 12, 20)) == (False, None)
+    assert store.imported_nav(64, '64001', date(2025, 1, 6)) == (False, None)
+    assert store.imported_nav(64, '64003', date(2024, 12, 24)) == (False, None)
+    # Imports never mark the fund house's range as downloaded
+    assert not store.has_range(64, date(2024, 12, 23), date(2024, 12, 24))
+
+
+def test_reimport_extends_ranges(store):
+    import_bulk_files([HISTORY], {'64001': {64}}, store=store)
+    assert store.imported_ranges(64, '64001') == [(date(2024, 12, 23), date(2025, 1, 2))]
+    import_bulk_files([SNAPSHOT], {'64001': {64}}, store=store)
+    assert store.imported_ranges(64, '64001') == [(date(2024, 12, 23), date(2025, 1, 3))]
+
+
+def test_get_imported_navs(store, monkeypatch):
+    import_bulk_files([HISTORY], {'64001': {64}}, store=store)
+    monkeypatch.setattr(mf_nav_util, 'get_nav_store', lambda: store)
+    lookups = [(64, 64001, date(2024, 12, 24)), (64, '64002', date(2024, 12, 24)),
+               (64, '64001', date(2024, 12, 27)), (64, '64001', date(2025, 2, 3))]
+    # Only positions 0 and 2 are covered; the others go to the download path
+    assert mf_nav_util.get_imported_navs(lookups) == {0: 80.24, 2: None}
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+import synth
+from rule_matcher import RuleMatcher, determine, determine_in_order
+
+ROWS = 100000
+AMOUNTS = [100.0, 250.0, 5000.0, 5000.004, 12345.5]
+
+
+def _keyword_rules():
+    # Digit-free keywords only, so the memo shares entries across numbers
+    rules = [
+        {'account': 'Assets:Recurring Deposit', 'patterns': ['neft'], 'value_conditions': [{'amount': 5000}]},
+        {'account': 'Income:Interest', 'patterns': ['interest', 'int.pd'], 'value_conditions': [{'amount': 250}]},
+    ]
+    for name, merchants in synth.MERCHANTS.items():
+        rules.append({'account': f'Expenses:{name}', 'patterns': list(merchants)})
+    rules.append({'account': 'Expenses:Transfers', 'patterns': ['upi', 'neft']})
+    return rules
+
+
+def _regex_rules():
+    rules = _keyword_rules()
+    rules.insert(1, {'account': 'Expenses:Rent', 'patterns': [r'upi/\d+/rent', 'landlord'],
+                     'value_conditions': [{'amount': 12345.5}]})
+    rules.append({'account': 'Expenses:Cards', 'patterns': [r'card \d{4}', r'^pos']})
+    rules.append({'account': 'Expenses:Kelvin', 'patterns': ['Kelvin']})
+    return rules
+
+
+def _list_rules():
+    rules = _regex_rules()
+    rules.insert(0, {'account': 'Expenses:Food Delivery', 'patterns': [['swiggy', 'okaxis']]})
+    rules.append({'account': 'Income:Salary', 'patterns': [['neft', 'salary']],
+                  'value_conditions': [{'amount': 100}]})
+    return rules
+
+
+def _rows(seed=0):
+    rng = random.Random(seed)
+    words = [merchant for merchants in synth.MERCHANTS.values() for merchant in merchants]
+    words += synth.NOISE + ['neft', 'salary', 'interest', 'int.pd', 'rent', 'pos', 'card', 'KELVIN', 'Landlord']
+    rows = []
+    for _ in range(ROWS):
+        parts = [rng.choice(words) for _ in range(rng.randint(1, 4))]
+        parts.insert(rng.randrange(len(parts) + 1), str(rng.randint(1, 10 ** rng.randint(1, 6))))
+        description = rng.choice(['/', ' ', '/']).join(parts)
+        if rng.random() < 0.3:
+            description = description.upper()
+        rows.append((description, rng.choice(AMOUNTS)))
+    return rows
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return _rows()
+
+
+@pytest.fixture(scope='module')
+def expected(rows):
+    """Returns the reference lookup's rule index (or None) per row, computed once per rule set."""
+    results = {}
+
+    def lookup(reference, make_rules):
+        key = (reference, make_rules)
+        if key not in results:
+            rules = make_rules()
+            matches = (reference(description, value, rules) for description, value in rows)
+            results[key] = _indexes(rules, matches)
+        return results[key]
+    return lookup
+
+
+def _indexes(rules, matches):
+    return [None if rule is None else rules.index(rule) for rule in matches]
+
+
+@pytest.mark.parametrize('make_rules', [_keyword_rules, _regex_rules, _list_rules])
+@pytest.mark.parametrize('memo_size', [0, 1000])
+def test_match_agrees_with_determine(rows, expected, make_rules, memo_size):
+    rules = make_rules()
+    matcher = RuleMatcher(rules, memo_size=memo_size)
+    assert _indexes(rules, (matcher.match(description, value) for description, value in rows)) == \
+        expected(determine, make_rules)
+    if memo_size:
+        assert matcher.memo_hits > 0
+
+
+@pytest.mark.parametrize('make_rules', [_keyword_rules, _regex_rules])
+@pytest.mark.parametrize('memo_size', [0, 1000])
+def test_match_in_order_agrees_with_determine_in_order(rows, expected, make_rules, memo_size):
+    # determine_in_order predates list patterns, so only string patterns here
+    rules = make_rules()
+    matcher = RuleMatcher(rules, memo_size=memo_size)
+    assert _indexes(rules, (matcher.match(description, value, in_order=True) for description, value in rows)) == \
+        expected(determine_in_order, make_rules)
+
+
+def test_match_many_agrees_with_match(rows, expected):
+    rules = _list_rules()
+    descriptions, values = zip(*rows)
+    assert _indexes(rules, RuleMatcher(rules).match_many(descriptions, values)) == expected(determine, _list_rules)
+
+
+def test_rows_cover_every_outcome(expected):
+    # Guards the generator: value rules, plain rules and no match all occur
+    found = set(expected(determine, _list_rules))
+    assert None in found and 0 in found and {1, 2} <= found and len(found) > 10
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import statement_formats
+from statement_formats import STATEMENT_COLUMNS, detect_format, read_statement
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def _fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+@pytest.mark.parametrize('name, format_name, header_row', [
+    ('icici_statement.csv', 'icici', 3),
+    ('hdfc_statement.csv', 'hdfc', 2),
+    ('sbi_statement.csv', 'sbi', 3),
+])
+def test_detects_each_banks_header(name, format_name, header_row):
+    statement_format, row = detect_format(_fixture(name))
+    assert (statement_format.name, row) == (format_name, header_row)
+
+
+def test_unknown_or_wrong_format_is_an_error(tmp_path):
+    unknown = tmp_path / 'unknown.csv'
+    unknown.write_text('Date,Narration\n01/01/2025,unknown bank\n')
+    with pytest.raises(ValueError, match="Can't tell the bank"):
+        detect_format(str(unknown))
+    with pytest.raises(ValueError, match="columns of the 'sbi' format"):
+        detect_format(_fixture('hdfc_statement.csv'), 'sbi')
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('hdfc_statement.csv', [
+        ('2024-04-02', 'UPI-SWIGGY-4100001', 412.5, 0.0),
+        ('2024-04-05', 'NEFT CR-ACME CORP-SALARY APR', 0.0, 85000.0),
+        ('2024-04-07', 'IMPS-LANDLORD-RENT APR', 22000.0, 0.0),
+    ]),
+    ('sbi_statement.csv', [
+        ('2024-04-01', 'BY TRANSFER-NEFT-ACME CORP SALARY', 0.0, 85000.0),
+        ('2024-04-03', 'TO TRANSFER-UPI-SWIGGY', 412.5, 0.0),
+        ('2024-04-09', 'ATM WDL', 2000.0, 0.0),
+    ]),
+])
+def test_reads_dates_and_amounts_in_each_format(name, expected):
+    df, = read_statement(_fixture(name))
+    assert list(df.columns) == STATEMENT_COLUMNS
+    assert [(str(day), description, withdrawal, deposit)
+            for day, description, withdrawal, deposit in zip(
+                df['date'].to_numpy(dtype='datetime64[D]'), df['description'], df['withdrawal'], df['deposit'])
+            ] == expected
+
+
+def test_chunks_match_the_whole_statement():
+    whole, = read_statement(_fixture('icici_statement.csv'))
+    chunks = list(read_statement(_fixture('icici_statement.csv'), chunksize=5))
+    assert [len(chunk) for chunk in chunks] == [5, 5, 2]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole)
+    assert whole['description'][6] == ''
+    assert np.isclose(whole['withdrawal'].sum(), 42808.67)
+
+
+def test_pyarrow_engine_reads_the_same_frame(monkeypatch):
+    pytest.importorskip('pyarrow')
+    arrow, = read_statement(_fixture('icici_statement.csv'))
+    monkeypatch.setattr(statement_formats, '_has_pyarrow', lambda: False)
+    c, = read_statement(_fixture('icici_statement.csv'))
+    pd.testing.assert_frame_equal(arrow, c)
+
+
+def test_excel_statement_reads_like_its_csv(tmp_path):
+    pytest.importorskip('openpyxl')
+    csv_df, = read_statement(_fixture('sbi_statement.csv'))
+    path = tmp_path / 'sbi_statement.xlsx'
+    raw = pd.read_csv(_fixture('sbi_statement.csv'), skiprows=3, dtype=str)
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame([['Account Name', 'Example Holder']]).to_excel(writer, index=False, header=False)
+        raw.to_excel(writer, index=False, startrow=2)
+    assert detect_format(str(path))[0].name == 'sbi'
+    excel_df, = read_statement(str(path))
+    pd.testing.assert_frame_equal(excel_df, csv_df)